@@ -0,0 +1,54 @@
+"""
+Memory and time of parsing one API page, whole versus streamed.
+
+Serializes a synthetic page of each --lengths size, then parses it the old way (read the whole
+body, json.loads, process_page) and through PageStream + process_page_batches. Reports the
+tracemalloc peak, which excludes the body bytes themselves, and wall time (tracemalloc slows
+both paths down; compare the times relative to each other).
+
+    python -m benchmarks.page_parse --lengths 5000 50000 500000
+"""
+import argparse
+import io
+import json
+import time
+import tracemalloc
+
+from src.ingest import crawler
+from src.ingest.synthetic import SyntheticEIA
+
+
+def _whole(body):
+    page = json.loads(io.BytesIO(body).read().decode())
+    return sum(1 for _ in crawler.process_page(page))
+
+
+def _streamed(body):
+    page = crawler.PageStream(io.BytesIO(body))
+    return sum(len(batch) for batch in crawler.process_page_batches(page))
+
+
+def _measure(label, parse, body):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = parse(body)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label:<16} rows={rows:,}  time={elapsed:.2f}s  peak={peak / 2**20:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-page versus streamed parsing of API pages")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[5000, 50_000, 500_000])
+    args = parser.parse_args()
+
+    for length in args.lengths:
+        body = json.dumps(SyntheticEIA(rows=length).page(0, length)).encode()
+        print(f"page of {length:,} rows ({len(body) / 2**20:.1f}MB body)")
+        _measure("json.loads", _whole, body)
+        _measure("PageStream", _streamed, body)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Load test for the read-only query service.
+
+Starts the service on a free local port against a clean database and hammers its endpoints from
+concurrent keep-alive clients, then reports requests/second and latency percentiles.
+
+    python -m benchmarks.service_load --db data/clean_gen_data.sqlite --clients 16 --seconds 10
+"""
+import argparse
+import http.client
+import random
+import threading
+import time
+
+from src.db import Database
+from src.service.server import create_server
+
+
+def _client(port, paths, deadline, latencies, errors, use_etag):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    etags = {}
+    while time.perf_counter() < deadline:
+        path = random.choice(paths)
+        headers = {"If-None-Match": etags[path]} if use_etag and path in etags else {}
+        start = time.perf_counter()
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status not in (200, 304):
+            errors.append(response.status)
+        etags[path] = response.getheader("ETag")
+    conn.close()
+
+
+def run(db_path, clients, seconds, pool_size, use_etag):
+    db = Database("clean", path=db_path, read_only=True)
+    ymax, ymin = db.pull_year_range()
+    db.close()
+
+    paths = ["/years"]
+    for year in range(ymin, ymax + 1):
+        paths += [f"/fuels/top?year={year}&n=10", f"/states?year={year}&fuel=ALL"]
+
+    server = create_server(path=db_path, port=0, pool_size=pool_size, quiet=True)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=_client, args=(port, paths, deadline, latencies, errors, use_etag))
+        for _ in range(clients)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    server.shutdown()
+    server.server_close()
+    server.queries.pool.close()
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"clients={clients} pool={pool_size} etag={use_etag} seconds={seconds}")
+    print(f"requests: {total:,}  errors: {len(errors)}")
+    print(f"throughput: {total / seconds:,.0f} req/s")
+    if total:
+        print(
+            f"latency ms: p50={latencies[total // 2] * 1000:.2f} "
+            f"p95={latencies[int(total * 0.95)] * 1000:.2f} "
+            f"p99={latencies[int(total * 0.99)] * 1000:.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the clean DB query service")
+    parser.add_argument("--db", default=None, help="Clean SQLite file (default from config.yaml)")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--etag", action="store_true", help="Send If-None-Match to measure 304 throughput")
+    args = parser.parse_args()
+
+    from src.config import DB_CONFIG
+    run(args.db or DB_CONFIG["clean"]["path"], args.clients, args.seconds, args.pool_size, args.etag)
+
+
+if __name__ == "__main__":
+    main()
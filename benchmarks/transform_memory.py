@@ -0,0 +1,91 @@
+"""
+Peak-RSS benchmark for the memory-bounded transform.
+
+Builds a raw database with --rows synthetic facility-fuel rows (once, reused on later runs), then
+runs aggregate_generation in a fresh subprocess per memory limit and reports its peak RSS and
+wall time. Each measurement runs in its own interpreter so earlier runs don't inflate the peak.
+
+    python -m benchmarks.transform_memory --rows 10000000 --limits 512 16 1
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.db import Database
+from src.ingest.synthetic import SyntheticEIA
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+
+
+def build_raw(path, rows):
+    raw = Database("raw", path=path)
+    raw.initialize_raw_tables()
+    existing = raw.get_max_raw_id()
+    if existing >= rows:
+        raw.close()
+        return
+
+    # Rows are deterministic for a given --rows, so an interrupted build resumes where it stopped
+    for batch in SyntheticEIA(rows=rows).batches(start=existing):
+        raw.save_raw_data(batch)
+        existing += len(batch)
+        print(f"  built {existing:,} / {rows:,} raw rows", end="\r")
+    print()
+    raw.close()
+
+
+def measure(raw_path, memory_limit_mb):
+    """
+    Child-process entry point: aggregate raw_path into a throwaway clean DB.
+    """
+    from src.transform.clean import aggregate_generation
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = Database("raw", path=raw_path, read_only=True)
+        clean = Database("clean", path=os.path.join(tmp, "clean.sqlite"))
+        clean.initialize_clean_tables()
+        clean.conn.execute("PRAGMA foreign_keys = OFF")     # mapping tables are not part of this benchmark
+
+        start = time.perf_counter()
+        aggregate_generation(raw, clean, memory_limit_mb=memory_limit_mb)
+        elapsed = time.perf_counter() - start
+
+        keys = clean.cur.execute(f"SELECT COUNT(*) FROM {clean.table}").fetchone()[0]
+        raw.close()
+        clean.close()
+    print(f"limit={memory_limit_mb}MB  keys={keys:,}  time={elapsed:.1f}s  peak_rss={_peak_rss_mb():.0f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of the transform under memory limits")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--db", default="data/bench_raw.sqlite", help="Raw SQLite file to build / reuse")
+    parser.add_argument("--limits", type=float, nargs="+", default=[512, 16, 1], help="Memory limits in MB")
+    parser.add_argument("--measure", type=float, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        measure(args.db, args.measure)
+        return
+
+    os.makedirs(os.path.dirname(args.db) or ".", exist_ok=True)
+    print(f"Preparing {args.rows:,} raw rows in {args.db}...")
+    build_raw(args.db, args.rows)
+
+    for limit in args.limits:
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.transform_memory", "--db", args.db, "--measure", str(limit)],
+            check=True
+        )
+
+
+if __name__ == "__main__":
+    main()
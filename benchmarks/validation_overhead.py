@@ -0,0 +1,69 @@
+"""
+Overhead of the validation stage relative to the transform.
+
+Times validation of every raw row from scratch (a backfill, the worst case) and of the newest
+--new-fraction of rows (a typical run, which only validates rows ingested since the last one),
+then a full transform over the same data. The YoY check covers at most validate.yoy_max_share
+of the table per run, so the backfill also reports how many ids it leaves to later runs.
+
+    python -m benchmarks.validation_overhead --rows 2000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from src.db import Database
+from src.transform.clean import (
+    build_state_mapping,
+    build_units_mapping,
+    build_fuels_mapping,
+    aggregate_generation,
+)
+from src.validate.quality import VALIDATION_WATERMARK, YOY_WATERMARK, validate_raw_data
+from benchmarks.transform_memory import build_raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validation time as a share of transform time")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--db", default="data/bench_raw.sqlite", help="Raw SQLite file to build / reuse")
+    parser.add_argument("--new-fraction", type=float, default=0.04, help="Share of rows treated as newly ingested")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or ".", exist_ok=True)
+    print(f"Preparing {args.rows:,} raw rows in {args.db}...")
+    build_raw(args.db, args.rows)
+
+    raw = Database("raw", path=args.db)
+    raw.initialize_raw_tables()
+    timings = {}
+    for label, fraction in (("backfill", 1.0), ("incremental", args.new_fraction)):
+        raw.cur.execute(f"DELETE FROM {raw.quarantine_table}")
+        high = raw.get_max_raw_id()
+        for key in (VALIDATION_WATERMARK, YOY_WATERMARK):
+            raw.set_raw_metadata(key, int(high * (1 - fraction)))
+        start = time.perf_counter()
+        counts = validate_raw_data(raw)
+        timings[label] = time.perf_counter() - start
+        print(f"{label}: quarantined {counts}, YoY ids left for later runs: {high - raw.get_raw_metadata(YOY_WATERMARK):,}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clean = Database("clean", path=os.path.join(tmp, "clean.sqlite"))
+        clean.initialize_clean_tables()
+        start = time.perf_counter()
+        build_state_mapping(raw, clean)
+        build_units_mapping(raw, clean)
+        build_fuels_mapping(raw, clean)
+        aggregate_generation(raw, clean)
+        transform_seconds = time.perf_counter() - start
+        clean.close()
+    raw.close()
+
+    print(f"transform: {transform_seconds:.2f}s")
+    for label, seconds in timings.items():
+        print(f"validate ({label}): {seconds:.2f}s  overhead: {seconds / transform_seconds:.1%}")
+
+
+if __name__ == "__main__":
+    main()
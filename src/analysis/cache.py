@@ -0,0 +1,126 @@
+import json
+import sqlite3
+from collections import OrderedDict
+
+
+# -----------------------------
+# Query Cache
+# -----------------------------
+
+class QueryCache:
+    """
+    Caches clean DB query results so repeated dashboard refreshes skip the aggregate queries.
+
+    Exposes the same query methods as the clean Database (pull_year_range, aggregate_generation,
+    state_generation), so it can be passed anywhere a clean_db is expected. Entries are kept in an
+    in-memory LRU and optionally in an on-disk SQLite tier. Every entry is stored with the clean DB
+    version it was computed against; the transform bumps that version whenever clean_generation is
+    written, which invalidates everything cached before it. Disk entries are also keyed by the
+    clean DB's random db_id, so a rebuilt DB or another clean path never reads them back.
+    """
+
+    def __init__(self, clean_db, max_entries: int = 128, disk_path: str = None):
+        """
+        :param clean_db: Database object for clean data
+        :param max_entries: int, maximum entries kept in memory before least recently used are evicted
+        :param disk_path: str, optional path to a SQLite file used as a second cache tier
+        """
+        self.clean_db = clean_db
+        self.max_entries = max_entries
+        self.memory = OrderedDict()     # key -> ((db_id, version), value)
+        self.hits = 0
+        self.misses = 0
+
+        self.disk = None
+        if disk_path:
+            self.disk = sqlite3.connect(disk_path)
+            self.disk.execute('''CREATE TABLE IF NOT EXISTS query_cache (
+                key TEXT PRIMARY KEY,
+                version INTEGER,
+                value TEXT)''')
+            self.disk.commit()
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+    def clear(self):
+        """
+        Drop every cached entry from both tiers.
+        """
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.execute("DELETE FROM query_cache")
+            self.disk.commit()
+
+    # ---- Cached queries ----
+
+    def pull_year_range(self):
+        return self._get(("year_range",), self.clean_db.pull_year_range, decode=tuple)
+
+    def aggregate_generation(self, year: int):
+        return self._get(
+            ("fuel_totals", year),
+            lambda: self.clean_db.aggregate_generation(year),
+            decode=_rows,
+        )
+
+    def state_generation(self, year: int, fuel_code: str = "ALL"):
+        return self._get(
+            ("state_totals", year, fuel_code),
+            lambda: self.clean_db.state_generation(year, fuel_code),
+            decode=_rows,
+        )
+
+    # ---- Internals ----
+
+    def _get(self, key, loader, decode):
+        """
+        Return the cached value for key if it matches the current clean DB identity and version,
+        otherwise run loader and cache its result in both tiers.
+        """
+        db_id, version = self.clean_db.get_clean_identity()
+
+        entry = self.memory.get(key)
+        if entry is not None and entry[0] == (db_id, version):
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        disk_key = json.dumps((db_id,) + key)
+        if self.disk is not None:
+            row = self.disk.execute(
+                "SELECT value FROM query_cache WHERE key = ? AND version = ?",
+                (disk_key, version)
+            ).fetchone()
+            if row is not None:
+                value = decode(json.loads(row[0]))
+                self._remember(key, (db_id, version), value)
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        value = loader()
+        self._remember(key, (db_id, version), value)
+        if self.disk is not None:
+            self.disk.execute(
+                """
+                INSERT INTO query_cache (key, version, value) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET version = excluded.version, value = excluded.value
+                """,
+                (disk_key, version, json.dumps(value))
+            )
+            self.disk.commit()
+        return value
+
+    def _remember(self, key, version, value):
+        self.memory[key] = (version, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+
+def _rows(value):
+    # JSON turns row tuples into lists; restore the shape sqlite3 returns
+    return [tuple(row) for row in value]
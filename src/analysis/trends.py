@@ -0,0 +1,239 @@
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.ticker as ticker
+
+from src.db import Database
+
+
+# -----------------------------
+# Data Loading
+# -----------------------------
+
+def dense_matrix(rows):
+    """
+    Pivot (year, label, value) rows into a dense year x label matrix. Missing cells are 0.
+
+    :param rows: iterable of (year, label, value) tuples, e.g. from fuel_generation_by_year
+    :return: tuple of (years, labels, matrix)
+        - years: int array of shape (Y,), ascending
+        - labels: str array of shape (L,), sorted
+        - matrix: float array of shape (Y, L)
+    """
+    rows = list(rows)
+    if not rows:
+        return np.array([], dtype=int), np.array([], dtype=str), np.zeros((0, 0))
+
+    years, labels, values = zip(*rows)
+    years, year_idx = np.unique(np.array(years, dtype=int), return_inverse=True)
+    labels, label_idx = np.unique(np.array(labels, dtype=str), return_inverse=True)
+
+    matrix = np.zeros((len(years), len(labels)))
+    np.add.at(matrix, (year_idx, label_idx), np.array(values, dtype=float))
+    return years, labels, matrix
+
+def fuel_matrix(clean_db):
+    """
+    Year x fuel generation matrix, loaded in one query.
+    """
+    return dense_matrix(clean_db.fuel_generation_by_year())
+
+def state_matrix(clean_db, fuel_code: str = "ALL"):
+    """
+    Year x state generation matrix for one fuel, loaded in one query.
+    """
+    return dense_matrix(clean_db.state_generation_by_year(fuel_code))
+
+
+# -----------------------------
+# Trend Metrics
+# -----------------------------
+
+def shares(matrix):
+    """
+    Share of each column in its year's total (rows sum to 1; years with no generation are 0).
+
+    :param matrix: float array of shape (Y, L)
+    :return: float array of shape (Y, L)
+    """
+    totals = matrix.sum(axis=1, keepdims=True)
+    return np.divide(matrix, totals, out=np.zeros_like(matrix), where=totals != 0)
+
+def yoy_growth(matrix):
+    """
+    Year-over-year growth of each column, (this year - last year) / |last year|.
+    Row i compares year i + 1 with year i; growth from 0 is NaN.
+
+    :param matrix: float array of shape (Y, L)
+    :return: float array of shape (Y - 1, L)
+    """
+    previous, current = matrix[:-1], matrix[1:]
+    return np.divide(
+        current - previous, np.abs(previous),
+        out=np.full_like(current, np.nan), where=previous != 0
+    )
+
+def cagr(years, matrix):
+    """
+    Compound annual growth rate of each column between the first and last year.
+    Columns that start or end at or below 0 have no CAGR (NaN).
+
+    :param years: int array of shape (Y,)
+    :param matrix: float array of shape (Y, L)
+    :return: float array of shape (L,)
+    """
+    span = years[-1] - years[0] if len(years) else 0
+    first, last = matrix[0], matrix[-1]
+    valid = (first > 0) & (last > 0) & (span > 0)
+    ratio = np.divide(last, first, out=np.ones_like(first), where=valid)
+    return np.where(valid, ratio ** (1 / max(span, 1)) - 1, np.nan)
+
+def ranks(matrix):
+    """
+    Rank of each column within its year, 1 for the largest. Ties keep column order.
+
+    :param matrix: float array of shape (Y, L)
+    :return: int array of shape (Y, L)
+    """
+    order = np.argsort(-matrix, axis=1, kind="stable")
+    result = np.empty_like(order)
+    np.put_along_axis(result, order, np.arange(1, matrix.shape[1] + 1)[None, :], axis=1)
+    return result
+
+def rank_changes(matrix):
+    """
+    Places gained by each column from one year to the next (positive = moved up).
+
+    :param matrix: float array of shape (Y, L)
+    :return: int array of shape (Y - 1, L)
+    """
+    r = ranks(matrix)
+    return r[:-1] - r[1:]
+
+def summarize(years, labels, matrix, top: int = 10):
+    """
+    Latest-year summary of the top columns, largest first.
+
+    :return: list of dicts with label, generation, share, yoy, cagr and rank_change
+        (places gained since the first year)
+    """
+    if not len(years):
+        return []
+    latest_share = shares(matrix)[-1]
+    growth = yoy_growth(matrix)
+    latest_yoy = growth[-1] if len(growth) else np.full(len(labels), np.nan)
+    long_run = cagr(years, matrix)
+    r = ranks(matrix)
+    gained = r[0] - r[-1]
+
+    summary = []
+    for i in np.argsort(-matrix[-1], kind="stable")[:top]:
+        summary.append({
+            "label": str(labels[i]),
+            "generation": float(matrix[-1, i]),
+            "share": float(latest_share[i]),
+            "yoy": float(latest_yoy[i]),
+            "cagr": float(long_run[i]),
+            "rank_change": int(gained[i]),
+        })
+    return summary
+
+
+# -----------------------------
+# Visualization
+# -----------------------------
+
+def plot_stacked_area(years, labels, matrix, title: str, top: int = 8):
+    """
+    Stacked-area chart of the top columns (by latest year) with the rest grouped as "Other".
+    """
+    order = np.argsort(-matrix[-1], kind="stable")
+    keep, rest = order[:top], order[top:]
+    series = [matrix[:, i] for i in keep]
+    names = [str(labels[i]) for i in keep]
+    if len(rest):
+        series.append(matrix[:, rest].sum(axis=1))
+        names.append("Other")
+
+    plt.figure(figsize=(12, 6))
+    plt.stackplot(years, np.clip(series, 0, None), labels=names)
+    plt.title(title, fontsize=14)
+    plt.ylabel("Generation (MWh)", fontsize=12)
+    plt.xlabel("Year", fontsize=12)
+
+    ax = plt.gca()
+    ax.yaxis.set_major_formatter(ticker.StrMethodFormatter("{x:,.0f}"))
+    ax.xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+
+    plt.legend(loc="upper left", bbox_to_anchor=(1.01, 1), fontsize=9)
+    plt.tight_layout()
+    plt.show()
+
+def plot_heatmap(years, labels, values, title: str, percent: bool = True):
+    """
+    Heatmap of a year x label metric (e.g. shares or YoY growth), labels on the y-axis.
+    NaN cells are left blank; a diverging color scale is used when values change sign.
+    """
+    finite = values[np.isfinite(values)]
+    diverging = finite.size and finite.min() < 0 < finite.max()
+    if diverging:
+        bound = np.percentile(np.abs(finite), 95) or 1
+        kwargs = {"cmap": "RdBu_r", "vmin": -bound, "vmax": bound}
+    else:
+        kwargs = {"cmap": "viridis"}
+
+    plt.figure(figsize=(12, max(4, len(labels) * 0.3)))
+    image = plt.imshow(np.ma.masked_invalid(values.T), aspect="auto", interpolation="nearest", **kwargs)
+    plt.title(title, fontsize=14)
+    plt.xlabel("Year", fontsize=12)
+    plt.yticks(range(len(labels)), labels, fontsize=8)
+    step = max(1, len(years) // 12)
+    plt.xticks(range(0, len(years), step), years[::step], rotation=45)
+
+    colorbar = plt.colorbar(image)
+    if percent:
+        colorbar.ax.yaxis.set_major_formatter(ticker.PercentFormatter(1.0))
+    plt.tight_layout()
+    plt.show()
+
+
+# -----------------------------
+# Main Runner
+# -----------------------------
+
+def main(top: int = 10):
+    """
+    Standalone runner for the trend analytics.
+    Prints the latest-year fuel summary and plots fuel and state trends over the full history.
+    """
+    clean_db = Database.shared("clean", read_only=True)
+
+    start = time.perf_counter()
+    years, fuels, by_fuel = fuel_matrix(clean_db)
+    state_years, states, by_state = state_matrix(clean_db)
+    summary = summarize(years, fuels, by_fuel, top)
+    elapsed = time.perf_counter() - start
+
+    if not summary:
+        print("No clean generation data to analyze.")
+        return
+
+    print(f"\nTop {len(summary)} fuel sources of {years[-1]} ({years[0]}-{years[-1]} trends):")
+    for row in summary:
+        print(
+            f"{row['label']:<6} {row['generation']:>18,.0f} MWh  share {row['share']:6.1%}  "
+            f"YoY {row['yoy']:+7.1%}  CAGR {row['cagr']:+6.1%}  rank {row['rank_change']:+d}"
+        )
+    print(f"Computed {by_fuel.size + by_state.size:,} year cells in {elapsed * 1000:.0f} ms.")
+
+    plot_stacked_area(years, fuels, by_fuel, f"Net Generation by Fuel, {years[0]}-{years[-1]}")
+    if len(years) > 1:
+        top_fuels = np.argsort(-by_fuel[-1], kind="stable")[:top]
+        plot_heatmap(years[1:], fuels[top_fuels], yoy_growth(by_fuel)[:, top_fuels], "Year-over-Year Growth of Top Fuels")
+    top_states = np.argsort(-by_state[-1], kind="stable")[:25]
+    plot_heatmap(state_years, states[top_states], shares(by_state)[:, top_states], "Share of U.S. Net Generation by State")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 from src.db import Database
+from src.analysis.cache import QueryCache
+from src.config import CACHE_CONFIG
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
@@ -18,6 +20,8 @@ def desired_year(clean_db, year_input: str = None) -> int:
     :raises ValueError: if year is invalid or out of range
     """
     ymax, ymin = clean_db.pull_year_range()
+    if ymax is None:
+        raise ValueError("No clean generation data yet. Run the transform first.")
 
     if year_input is None:
         year_input = input(f"Enter a year between {ymin} and {ymax}: ")
@@ -99,12 +103,14 @@ def main():
     Standalone runner for the visualization module.
     Prompts user for a year and plots top 10 fuel sources.
     """
-    clean_db = Database("clean")
+    clean_db = Database.shared("clean", read_only=True)
+    queries = QueryCache(clean_db, CACHE_CONFIG["max_entries"], CACHE_CONFIG["disk_path"])
     try:
-        year = desired_year(clean_db)
-        fuel_codes, generation, top10 = create_arrays(clean_db, year)
+        year = desired_year(queries)
+        fuel_codes, generation, top10 = create_arrays(queries, year)
         plot_top10(fuel_codes, generation, year)
     finally:
+        queries.close()
         clean_db.close()
 
 
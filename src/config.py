@@ -19,16 +19,55 @@ DB_CONFIG = {
         "path": cfg["database"]["raw"]["path"],
         "table": cfg["database"]["raw"]["table"],
         "metadata_table": cfg["database"]["raw"].get("metadata_table"),
+        "quarantine_table": cfg["database"]["raw"].get("quarantine_table", "raw_quarantine"),
+        "dimension_tables": cfg["database"]["raw"].get(
+            "dimension_tables", {"states": "raw_states", "fuels": "raw_fuels", "units": "raw_units"}
+        ),
     },
     "clean": {
         "path": cfg["database"]["clean"]["path"],
         "table": cfg["database"]["clean"]["table"],
+        "monthly_table": cfg["database"]["clean"].get("monthly_table", "clean_generation_monthly"),
+        "plant_table": cfg["database"]["clean"].get("plant_table", "clean_plant_generation"),
         "mapping_tables": cfg["database"]["clean"].get("mapping_tables",[]),
     }
 }
 
 EIA_CONFIG = cfg["eia"]
 
+# Analysis query cache configuration
+CACHE_CONFIG = {
+    "max_entries": cfg.get("analysis", {}).get("cache", {}).get("max_entries", 128),
+    "disk_path": cfg.get("analysis", {}).get("cache", {}).get("disk_path"),
+}
+
+# Transform configuration
+TRANSFORM_CONFIG = {
+    "memory_limit_mb": cfg.get("transform", {}).get("memory_limit_mb", 512),
+}
+
+# Validation configuration
+VALIDATE_CONFIG = {
+    "chunk_rows": cfg.get("validate", {}).get("chunk_rows", 500000),
+    "yoy_max_ratio": cfg.get("validate", {}).get("yoy_max_ratio", 5.0),
+    "yoy_min_generation": cfg.get("validate", {}).get("yoy_min_generation", 1000),
+    "yoy_max_share": cfg.get("validate", {}).get("yoy_max_share", 0.05),
+}
+
+# Daemon / scheduler configuration
+DAEMON_CONFIG = {
+    "interval_seconds": cfg.get("daemon", {}).get("interval_seconds", 3600),
+    "lock_path": cfg.get("daemon", {}).get("lock_path", "data/pipeline.lock"),
+    "stats_path": cfg.get("daemon", {}).get("stats_path", "data/pipeline_stats.json"),
+}
+
+# Read-only query service configuration
+SERVICE_CONFIG = {
+    "host": cfg.get("service", {}).get("host", "127.0.0.1"),
+    "port": cfg.get("service", {}).get("port", 8080),
+    "pool_size": cfg.get("service", {}).get("pool_size", 8),
+}
+
 def get_dataset_url(eia_cfg, dataset_name: str):
     """
     Returns the full URL for the dataset with the given name.
@@ -46,3 +85,46 @@ def get_dataset_url(eia_cfg, dataset_name: str):
         if d["name"] == dataset_name:
             return base_url + d["path"]
 
+    raise ValueError(f"Dataset not found in config: {dataset_name}")
+
+def get_datasets(eia_cfg):
+    """
+    Returns every enabled dataset with its full URL and crawl defaults filled in.
+
+    :param eia_cfg: dict, the 'eia' section of config.yaml
+    :return: list of dict, each with keys 'name', 'url', 'pipeline', 'table', 'frequency',
+        'data', 'filters', 'fields', 'numeric', 'unique', 'partition' and 'annual_rollup'
+    :raises ValueError: if a dataset has no field mapping, or a monthly dataset's annual_rollup
+        would write the same clean_generation rows as the enabled annual dataset
+    """
+    datasets = []
+    for d in eia_cfg["datasets"]:
+        if not d.get("enabled", True):
+            continue
+        if not d.get("fields"):
+            raise ValueError(f"Dataset {d['name']} has no field mapping")
+        datasets.append({
+            "name": d["name"],
+            "url": eia_cfg["base_url"] + d["path"],
+            "pipeline": d.get("pipeline", d["name"]),
+            "table": d.get("table", DB_CONFIG["raw"]["table"]),
+            "frequency": d.get("frequency", "annual"),
+            "data": d.get("data", ["generation"]),
+            "filters": d.get("filters", {}),
+            "fields": d["fields"],
+            "numeric": d.get("numeric", []),
+            "unique": d.get("unique", list(d["fields"])),
+            "partition": d.get("partition"),            # "year" splits the raw table per year
+            "annual_rollup": d.get("annual_rollup", False),
+        })
+
+    # Both write (year, state, fuel) totals into clean_generation and would overwrite each other
+    annual = [d["name"] for d in datasets if d["table"] == DB_CONFIG["raw"]["table"]]
+    for d in datasets:
+        if d["annual_rollup"] and annual:
+            raise ValueError(
+                f"Dataset {d['name']} has annual_rollup enabled, but {annual[0]} already fills "
+                "clean_generation; disable one of them"
+            )
+    return datasets
+
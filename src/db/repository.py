@@ -1,8 +1,95 @@
+import atexit
+import math
+import os
+import re
 import sqlite3
+import threading
+from pathlib import Path
 from src.config import DB_CONFIG
 
+# Columns of raw_generation populated from the facility-fuel dataset, in insert order
+RAW_COLUMNS = [
+    "period", "plantCode", "plantName", "fuel2002", "fuelTypeDescription",
+    "state", "stateDescription", "primeMover", "generation", "units",
+]
+
+# Raw columns tracked by each dimension table as (code column, description column or None)
+RAW_DIMENSIONS = {
+    "states": ("state", "stateDescription"),
+    "fuels": ("fuel2002", "fuelTypeDescription"),
+    "units": ("units", None),
+}
+
+_PERIOD_RE = re.compile(r"^(\d{4})(?:-(\d{2}))?$")
+
+def parse_period(period):
+    """
+    Parse an EIA period into (year, month). Annual periods ("2020") have month None,
+    monthly periods ("2020-03") carry the month as an int.
+
+    :param period: str or int
+    :return: tuple of (int, int or None)
+    :raises ValueError: if period is not YYYY or YYYY-MM
+    """
+    match = _PERIOD_RE.match(str(period).strip())
+    if match is None:
+        raise ValueError(f"Unrecognized period: {period}")
+    year, month = match.groups()
+    return int(year), int(month) if month else None
+
+def partition_table(table, year):
+    """
+    Name of the per-year partition of a raw table (e.g. raw_generation_monthly_2020).
+    """
+    return f"{table}_{int(year)}"
+
+def exact_terms(terms):
+    """
+    Replace a list of floats by a few floats with exactly the same sum: the correctly rounded
+    total, then the correctly rounded remainder, and so on (usually one or two floats). Keeping
+    running sums this way and finishing with math.fsum gives the same, correctly rounded result
+    whatever order or grouping the values were added in.
+
+    :param terms: list of float
+    :return: list of float
+    """
+    total = math.fsum(terms)
+    if not math.isfinite(total):
+        return [total]
+    exact = [total]
+    while True:
+        rest = math.fsum(terms + [-t for t in exact])
+        if not rest:
+            return exact
+        exact.append(rest)
+
+class ExactSum:
+    """
+    SQLite aggregate (registered as fsum) summing a column with math.fsum instead of SUM's
+    running float addition, whose result depends on the order the rows are visited in.
+    """
+    _BUFFER = 64
+
+    def __init__(self):
+        self.terms = []
+
+    def step(self, value):
+        if value is None:
+            return
+        self.terms.append(value)
+        if len(self.terms) > self._BUFFER:
+            self.terms = exact_terms(self.terms)
+
+    def finalize(self):
+        return math.fsum(self.terms) if self.terms else None
+
 class Database:
-    def __init__(self, db_type="raw"):
+    # Process-wide handles returned by Database.shared, keyed by (pid, thread, db_type, path, read_only)
+    _registry = {}
+    # (pid, path, db_type) whose schema DDL already ran in this process
+    _initialized = set()
+
+    def __init__(self, db_type="raw", path=None, read_only=False, check_same_thread=True):
         """
         Initialize a Database object for interacting with either the raw or clean SQLite database.
         
@@ -11,27 +98,109 @@ class Database:
             - "raw": database storing unprocessed API data and crawl metadata
             - "clean": database storing normalized/aggregated data and mapping tables
             Default is "raw".
+        :param path: str, optional
+            SQLite file to open instead of the configured path for db_type.
+        :param read_only: bool, optional
+            Open the file through a read-only URI (mode=ro). Default is False.
+        :param check_same_thread: bool, optional
+            Set False for handles passed between threads (one thread at a time), e.g. by a pool.
+            Default is True.
         :raises ValueError: if db_type is not "raw" or "clean"
         """   
         cfg = DB_CONFIG[db_type]
-        self.path = cfg["path"]
-        self.conn = sqlite3.connect(self.path)
+        self.path = path or cfg["path"]
+        self.read_only = read_only
+        if read_only:
+            uri = Path(self.path).absolute().as_uri() + "?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, timeout=30, check_same_thread=check_same_thread)
+        else:
+            # concurrent crawlers share the raw DB
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=check_same_thread)
         self.conn.execute("PRAGMA foreign_keys = ON")
         self.cur = self.conn.cursor()
         self.table = cfg["table"]
         self.metadata_table = cfg.get("metadata_table")     # only for raw DB
+        self.quarantine_table = cfg.get("quarantine_table") # only for raw DB
+        self.dimension_tables = cfg.get("dimension_tables") # only for raw DB
         self.mapping_tables = cfg.get("mapping_tables")     # only for clean DB
+        self.monthly_table = cfg.get("monthly_table")       # only for clean DB
+        self.plant_table = cfg.get("plant_table")           # only for clean DB
+        self._partitions = set()                            # raw partitions known to exist
+        self.db_type = db_type
+        self.is_shared = False
+
+    @classmethod
+    def shared(cls, db_type="raw", path=None, read_only=False):
+        """
+        Return this process's shared handle for (db_type, path, read_only), opening it on first use.
+
+        Shared handles stay open until Database.close_all (registered with atexit), so ingest,
+        validate, transform and visualize in one run reuse the same connections; close() on a
+        shared handle is a no-op. sqlite3 connections are bound to the thread that opened them,
+        so each thread gets its own handle, and a forked child never reuses its parent's.
+
+        :param db_type: str, "raw" or "clean"
+        :param path: str, optional SQLite file (default from config.yaml)
+        :param read_only: bool, open through a mode=ro URI
+        :return: Database
+        """
+        path = path or DB_CONFIG[db_type]["path"]
+        key = (os.getpid(), threading.get_ident(), db_type, path, read_only)
+        db = cls._registry.get(key)
+        if db is None:
+            db = cls(db_type, path=path, read_only=read_only)
+            db.is_shared = True
+            cls._registry[key] = db
+        return db
+
+    @classmethod
+    def close_all(cls):
+        """
+        Close every shared handle opened by this thread and drop all others from the registry.
+        sqlite3 refuses to close a connection from another thread, so handles of other threads
+        are left to be closed when they are garbage collected, and handles inherited through
+        fork are dropped since their connections belong to the parent.
+        """
+        pid, thread = os.getpid(), threading.get_ident()
+        for key, db in list(cls._registry.items()):
+            del cls._registry[key]
+            if key[:2] == (pid, thread):
+                db.is_shared = False
+                db.close()
+
+    def _schema_ready(self):
+        # In-memory databases are private to their connection, so their DDL always runs
+        return self.path != ":memory:" and (os.getpid(), self.path, self.db_type) in Database._initialized
+
+    def _mark_schema_ready(self):
+        if self.path != ":memory:":
+            Database._initialized.add((os.getpid(), self.path, self.db_type))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        self.close()
 
     def commit(self):
         self.conn.commit()
 
     def close(self):
+        if self.is_shared:
+            return
         self.cur.close()
         self.conn.close()
     
     # ---- Raw DB Methods ----
 
     def initialize_raw_tables(self):
+        if self._schema_ready():
+            return
+        self.cur.execute("PRAGMA journal_mode = WAL")
         self.cur.execute(f'''
             CREATE TABLE IF NOT EXISTS {self.table} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -58,33 +227,222 @@ class Database:
             )
         ''')
 
+        self.cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.quarantine_table} (
+            raw_id INTEGER,
+            check_name TEXT,
+            severity TEXT,
+            detail TEXT,
+            detectedAt TIMESTAMP,
+            UNIQUE (raw_id, check_name)
+            )
+        ''')
+
+        self.cur.execute('''CREATE TABLE IF NOT EXISTS raw_metadata (
+            key TEXT PRIMARY KEY,
+            value INTEGER)''')
+        # Random id of this raw DB file: a rebuilt raw DB restarts its row and dimension ids, so
+        # watermarks kept in the clean DB are only valid next to the db_id they were taken from
+        self.cur.execute("INSERT OR IGNORE INTO raw_metadata (key, value) VALUES ('db_id', abs(random()))")
+        # Raw DBs validated before raw_metadata existed kept the validation watermarks in crawl_metadata
+        self.cur.execute(f'''
+            INSERT OR IGNORE INTO raw_metadata (key, value)
+            SELECT pipeline || '_watermark', lastOffset FROM {self.metadata_table}
+            WHERE pipeline IN ('validation', 'validation_yoy')
+        ''')
+        self.cur.execute(f"DELETE FROM {self.metadata_table} WHERE pipeline IN ('validation', 'validation_yoy')")
+
+        self.initialize_dimension_tables()
+        self.commit()
+        self._mark_schema_ready()
+
+    def initialize_dimension_tables(self):
+        """
+        Create the raw dimension tables (distinct state, fuel and unit values seen at ingest),
+        backfilling them from the raw tables when they are empty.
+        """
+        for table in self.dimension_tables.values():
+            self.cur.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT,
+                description TEXT
+                )
+            ''')
+            # Expression index so NULL codes / descriptions are deduplicated too
+            self.cur.execute(f'''CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_value
+                ON {table}(IFNULL(code, ''), IFNULL(description, ''))''')
+        self.backfill_dimensions()
+        self.commit()
+
+    def initialize_dataset_table(self, table, columns, unique, numeric=()):
+        """
+        Create a raw table for a configured dataset if it does not exist.
+
+        :param table: str, raw table name
+        :param columns: list of str, column names in insert order
+        :param unique: list of str, columns forming the dataset's unique key
+        :param numeric: list of str, columns stored as REAL (all others are TEXT)
+        """
+        column_defs = ",\n".join(
+            f"{c} {'REAL' if c in numeric else 'TEXT'}" for c in columns
+        )
+        self.cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            {column_defs},
+            ingestionTimestamp TIMESTAMP,
+            UNIQUE ({", ".join(unique)})
+            )
+        ''')
         self.commit()
 
-    def save_raw_data(self, records: list[dict]):
+    def save_raw_data(self, records: list[dict], table=None, columns=None):
         """
-        Insert raw API data into raw_generation table.
+        Insert raw API data into raw_generation table, or into another dataset's raw table.
         
         :param records: list of dict
             Each dict must contain the following keys:
                 -   "period", "plantCode", "plantName", "fuel2002", "fuelTypeDescription",
                     "state", "stateDescription", "primeMover", "generation", "units"
+            or the keys given in columns.
+        :param table: str, optional raw table name (default raw_generation)
+        :param columns: list of str, optional column names (default raw_generation columns)
         :return: integer
         """
-        inserted = 0
-        for r in records:
-            self.cur.execute(
-                f"""
-                INSERT OR IGNORE INTO {self.table}
-                (period, plantCode, plantName, fuel2002, fuelTypeDescription, state, stateDescription, primeMover, generation, units, ingestionTimestamp)
-                VALUES ( ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                """,
-                (r["period"], r["plantCode"], r["plantName"], r["fuel2002"], r["fuelTypeDescription"],
-                r["state"], r["stateDescription"], r["primeMover"], r["generation"], r["units"])
-            )
-            inserted += self.cur.rowcount
+        table = table or self.table
+        columns = columns or RAW_COLUMNS
+        placeholders = ", ".join("?" for _ in columns)
+        self.cur.executemany(
+            f"""
+            INSERT OR IGNORE INTO {table}
+            ({", ".join(columns)}, ingestionTimestamp)
+            VALUES ({placeholders}, CURRENT_TIMESTAMP)
+            """,
+            [tuple(r[c] for c in columns) for r in records]
+        )
+        inserted = max(self.cur.rowcount, 0)
+        self._update_dimensions(records, columns)
         self.commit()
         return inserted
 
+    def _update_dimensions(self, records, columns):
+        # Record new state / fuel / unit values in the same transaction as the rows carrying them
+        for name, (code_col, desc_col) in RAW_DIMENSIONS.items():
+            if code_col not in columns or (desc_col and desc_col not in columns):
+                continue
+            # dict.fromkeys keeps first-seen order, so new values get ids in ingest order
+            values = dict.fromkeys((r[code_col], r[desc_col] if desc_col else None) for r in records)
+            self.cur.executemany(
+                f"INSERT OR IGNORE INTO {self.dimension_tables[name]} (code, description) VALUES (?, ?)",
+                values
+            )
+
+    def backfill_dimensions(self):
+        """
+        Fill empty dimension tables from every raw table that has the dimension's columns
+        (raw_generation, monthly partitions, ...). Runs a full scan, so only when all of them
+        are empty, e.g. for a raw DB ingested before the dimension tables existed.
+        """
+        for table in self.dimension_tables.values():
+            if self.cur.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                return
+
+        self.cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        for (source,) in self.cur.fetchall():
+            available = {row[1] for row in self.conn.execute(f"PRAGMA table_info({source})")}
+            for name, (code_col, desc_col) in RAW_DIMENSIONS.items():
+                if code_col not in available or (desc_col and desc_col not in available):
+                    continue
+                self.cur.execute(f'''
+                    INSERT OR IGNORE INTO {self.dimension_tables[name]} (code, description)
+                    SELECT DISTINCT {code_col}, {desc_col or 'NULL'} FROM {source}
+                ''')
+
+    def get_raw_metadata(self, key, default=0):
+        """
+        Load an integer value from the raw_metadata table.
+
+        :param key: str, metadata key (e.g. 'db_id')
+        :param default: value returned when the key does not exist
+        :return: int
+        """
+        self.cur.execute("SELECT value FROM raw_metadata WHERE key = ?", (key,))
+        row = self.cur.fetchone()
+        return row[0] if row else default
+
+    def set_raw_metadata(self, key, value, commit=True):
+        """
+        Insert or update an integer value in the raw_metadata table.
+        """
+        self.cur.execute(
+            """
+            INSERT INTO raw_metadata (key, value) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+            """,
+            (key, value)
+        )
+        if commit:
+            self.commit()
+
+    def get_dimension_values(self, name, since_id=0):
+        """
+        Dimension values first seen after since_id, in the order they were ingested.
+
+        :param name: str, "states", "fuels" or "units"
+        :param since_id: int, highest dimension id already consumed
+        :return: list of (id, code, description) tuples
+        """
+        self.cur.execute(
+            f"SELECT id, code, description FROM {self.dimension_tables[name]} WHERE id > ? ORDER BY id",
+            (since_id,)
+        )
+        return self.cur.fetchall()
+
+    def save_partitioned_raw_data(self, records: list[dict], table, columns, unique, numeric=()):
+        """
+        Insert raw API data into per-year partitions of a raw table, creating partitions as needed.
+        Rows are routed on the year of their "period" (YYYY or YYYY-MM).
+
+        :param records: list of dict keyed by columns
+        :param table: str, base raw table name; rows go to partition_table(table, year)
+        :param columns: list of str, column names in insert order
+        :param unique: list of str, columns forming the dataset's unique key
+        :param numeric: list of str, columns stored as REAL
+        :return: integer
+        """
+        by_year = {}
+        for r in records:
+            year, _ = parse_period(r["period"])
+            by_year.setdefault(year, []).append(r)
+
+        inserted = 0
+        for year, rows in by_year.items():
+            part = partition_table(table, year)
+            if part not in self._partitions:
+                self.initialize_dataset_table(part, columns, unique, numeric)
+                self._partitions.add(part)
+            inserted += self.save_raw_data(rows, part, columns)
+        return inserted
+
+    def list_partitions(self, table, years=None):
+        """
+        List the per-year partitions of a raw table.
+
+        :param table: str, base raw table name
+        :param years: iterable of int, optional; only partitions for these years are returned
+        :return: list of (year, partition table name) tuples ordered by year
+        """
+        self.cur.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+            (f"{table}_[0-9][0-9][0-9][0-9]",)
+        )
+        partitions = sorted((int(name[-4:]), name) for (name,) in self.cur.fetchall())
+        if years is not None:
+            wanted = {int(y) for y in years}
+            partitions = [(y, name) for y, name in partitions if y in wanted]
+        return partitions
+
     def load_raw_data(self):
         """
         Load all raw rows from raw_generation table.
@@ -136,41 +494,191 @@ class Database:
             )
         self.commit()
 
-    def get_raw_states(self):
+    def _valid_rows(self):
         """
-        Fetch distinct state codes and descriptions from raw data.
+        SQL condition excluding raw_generation rows quarantined with severity 'error'.
         """
-        self.cur.execute(
-            f"SELECT DISTINCT state, stateDescription FROM {self.table} WHERE state IS NOT NULL"
-        )
+        return f"id NOT IN (SELECT raw_id FROM {self.quarantine_table} WHERE severity = 'error')"
+
+    def get_raw_generation_rows(self):
+        """
+        Fetch raw generation rows used for aggregation. Rows are returned as a lazy cursor
+        rather than a list, so a full scan never has to fit in memory.
+        """
+        return self.conn.execute(f"""
+            SELECT period, state, fuel2002, generation, units
+            FROM {self.table}
+            WHERE state IS NOT NULL AND {self._valid_rows()}
+        """)
+
+    # ---- Validation ----
+
+    def get_suspect_rows(self, condition, lo, hi, params=()):
+        """
+        Fetch raw_generation rows with lo < id <= hi matching a SQL condition. Used to pull only
+        the rows failing at least one validation check out of a chunk in a single pass.
+
+        :param params: tuple, values for the condition's ? placeholders
+        :return: list of (id, generation, units, fuel2002, fuelTypeDescription, state, stateDescription) tuples
+        """
+        self.cur.execute(f"""
+            SELECT id, generation, units, fuel2002, fuelTypeDescription, state, stateDescription
+            FROM {self.table}
+            WHERE id > ? AND id <= ? AND ({condition})
+        """, (lo, hi, *params))
         return self.cur.fetchall()
-    
-    def get_raw_units(self):
+
+    def get_failing_dimension_codes(self, name, condition):
         """
-        Fetch distinct units from raw data.
+        Codes in a dimension table whose values match a SQL condition written against the raw
+        columns they were taken from (e.g. "units NOT IN ('megawatthours')" for "units").
+
+        :param name: str, "states", "fuels" or "units"
+        :param condition: str, SQL condition on the dimension's raw columns
+        :return: list of distinct codes (None for a missing code)
         """
-        self.cur.execute(
-            f"SELECT DISTINCT units FROM {self.table}"
-        )
+        code_col, desc_col = RAW_DIMENSIONS[name]
+        columns = f"code AS {code_col}" + (f", description AS {desc_col}" if desc_col else "")
+        self.cur.execute(f"""
+            SELECT DISTINCT {code_col}
+            FROM (SELECT {columns} FROM {self.dimension_tables[name]})
+            WHERE {condition}
+        """)
         return [row[0] for row in self.cur.fetchall()]
-    
-    def get_raw_fuels(self):
+
+    def get_adjacent_year_generation(self, lo, hi, max_ratio, min_generation, fuel_code="ALL"):
         """
-        Fetch distinct fuel codes from raw data.
+        For annual raw_generation rows with lo < id <= hi and the given fuel, fetch the same
+        plant/fuel generation for the previous and next year. Each lookup is a seek on the
+        (period, plantCode, fuel2002) unique index. Only rows where either comparison is a jump
+        (the condition of validate.quality.yoy_jumps) are returned, so the rest never leave SQLite.
+
+        :param max_ratio: float, jump threshold as a multiple of the smaller of the two years
+        :param min_generation: float, skip comparisons where both years are below this
+        :return: list of (id, generation, prev_id, prev_generation, next_id, next_generation) tuples;
+            prev/next columns are None where that year is missing
         """
-        self.cur.execute(
-            f"SELECT DISTINCT fuel2002, fuelTypeDescription FROM {self.table}"
-        )
+        jump = """(
+            MAX(ABS(r.generation), ABS({0}.generation)) >= :min_generation
+            AND ABS(r.generation - {0}.generation) > :max_ratio * MIN(ABS(r.generation), ABS({0}.generation))
+        )"""
+        self.cur.execute(f"""
+            SELECT r.id, r.generation, p.id, p.generation, n.id, n.generation
+            FROM {self.table} r
+            LEFT JOIN {self.table} p
+                ON p.period = CAST(CAST(r.period AS INTEGER) - 1 AS TEXT)
+                AND p.plantCode = r.plantCode AND p.fuel2002 = r.fuel2002
+            LEFT JOIN {self.table} n
+                ON n.period = CAST(CAST(r.period AS INTEGER) + 1 AS TEXT)
+                AND n.plantCode = r.plantCode AND n.fuel2002 = r.fuel2002
+            WHERE r.id > :lo AND r.id <= :hi AND r.fuel2002 = :fuel_code
+                AND r.period GLOB '[0-9][0-9][0-9][0-9]'
+                AND ({jump.format("p")} OR {jump.format("n")})
+        """, {"lo": lo, "hi": hi, "fuel_code": fuel_code, "max_ratio": max_ratio, "min_generation": min_generation})
         return self.cur.fetchall()
 
-    def get_raw_generation_rows(self):
+    def save_quarantine(self, rows):
+        """
+        Insert quarantine entries computed outside SQL.
+
+        :param rows: iterable of (raw_id, check_name, severity, detail) tuples
+        :return: int, rows quarantined
+        """
+        self.cur.executemany(f"""
+            INSERT OR IGNORE INTO {self.quarantine_table}
+            (raw_id, check_name, severity, detail, detectedAt)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, rows)
+        return max(self.cur.rowcount, 0)
+
+    def get_raw_years(self, since_id=0):
+        """
+        Fetch the distinct years present in raw data. Without since_id this reads only the
+        (period, ...) unique index; with it, only rows added after that id are scanned.
+
+        :param since_id: int, optional; only consider rows with id > since_id
+        :return: list of int, ascending
+        """
+        if since_id:
+            self.cur.execute(f"SELECT DISTINCT period FROM {self.table} WHERE id > ?", (since_id,))
+        else:
+            self.cur.execute(f"SELECT DISTINCT period FROM {self.table}")
+        return sorted({parse_period(period)[0] for (period,) in self.cur.fetchall()})
+
+    def get_max_raw_id(self, table=None):
+        """
+        Highest row id in a raw table (0 when empty). New rows always get larger ids,
+        so this works as a watermark for incremental transforms.
         """
-        Fetch raw generation rows used for aggregation.
+        self.cur.execute(f"SELECT MAX(id) FROM {table or self.table}")
+        return self.cur.fetchone()[0] or 0
+
+    def get_year_generation_totals(self, year: int):
+        """
+        Sum generation per (state, fuel) for one year of raw data. Sums use the fsum aggregate
+        (ExactSum) rather than SUM, so they match the streaming aggregation in transform.clean
+        bit for bit.
+
+        :param year: int
+        :return: list of (state, fuel2002, generation, min_units, max_units) tuples;
+            min_units != max_units means the group mixes units
         """
+        self.conn.create_aggregate("fsum", 1, ExactSum)
         self.cur.execute(f"""
-            SELECT period, state, fuel2002, generation, units
+            SELECT state, fuel2002, fsum(generation), MIN(units), MAX(units)
+            FROM {self.table}
+            WHERE period = ? AND state IS NOT NULL AND {self._valid_rows()}
+            GROUP BY state, fuel2002
+        """, (str(year),))
+        return self.cur.fetchall()
+
+    def get_year_plant_rows(self, year: int):
+        """
+        Fetch plant-level rows for one year of raw data, one per (plantCode, fuel2002).
+
+        :param year: int
+        :return: list of (plantCode, plantName, state, fuel2002, generation, units) tuples
+        """
+        self.cur.execute(f"""
+            SELECT plantCode, plantName, state, fuel2002, generation, units
             FROM {self.table}
+            WHERE period = ? AND state IS NOT NULL AND {self._valid_rows()}
+        """, (str(year),))
+        return self.cur.fetchall()
+
+    def get_monthly_generation_totals(self, table):
+        """
+        Sum generation per (period, state, fuel) inside a single monthly partition, exactly
+        (fsum aggregate, see ExactSum). Generation is cast to REAL as SUM would, since partitions
+        of datasets without numeric columns store it as text.
+
+        :param table: str, partition table name
+        :return: list of (period, state, fuel2002, generation, min_units, max_units) tuples;
+            min_units != max_units means the group mixes units
+        """
+        self.conn.create_aggregate("fsum", 1, ExactSum)
+        self.cur.execute(f"""
+            SELECT period, state, fuel2002, fsum(CAST(generation AS REAL)), MIN(units), MAX(units)
+            FROM {table}
+            WHERE state IS NOT NULL
+            GROUP BY period, state, fuel2002
+        """)
+        return self.cur.fetchall()
+
+    def get_monthly_year_totals(self, table):
+        """
+        Sum generation per (year, state, fuel) inside a single monthly partition, exactly, for
+        the annual rollup. Adding up the rounded monthly sums instead could differ in the last bit.
+
+        :param table: str, partition table name
+        :return: list of (year, state, fuel2002, generation, units) tuples
+        """
+        self.conn.create_aggregate("fsum", 1, ExactSum)
+        self.cur.execute(f"""
+            SELECT CAST(substr(period, 1, 4) AS INTEGER), state, fuel2002, fsum(CAST(generation AS REAL)), MIN(units)
+            FROM {table}
             WHERE state IS NOT NULL
+            GROUP BY substr(period, 1, 4), state, fuel2002
         """)
         return self.cur.fetchall()
 
@@ -185,8 +693,16 @@ class Database:
             Set reset=True to delete all tables in clean DB and start fresh
             Default value is False
         """
+        if reset is False and self._schema_ready():
+            return
+
+        # WAL lets the query service's read-only connections read while the transform writes
+        self.cur.execute("PRAGMA journal_mode = WAL")
+
         if reset is True:
             self.cur.execute(f"DROP TABLE IF EXISTS {self.table}")
+            self.cur.execute(f"DROP TABLE IF EXISTS {self.monthly_table}")
+            self.cur.execute(f"DROP TABLE IF EXISTS {self.plant_table}")
             for t in self.mapping_tables:
                 self.cur.execute(f"DROP TABLE IF EXISTS {t}")
         
@@ -206,6 +722,23 @@ class Database:
             )
         ''')
         
+        self.cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.monthly_table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            year INTEGER,
+            month INTEGER,
+            state_code TEXT,
+            fuel_code TEXT,
+            generation REAL,
+            units TEXT,
+            updated_at TIMESTAMP,
+            UNIQUE (year, month, state_code, fuel_code),
+            FOREIGN KEY (state_code) REFERENCES states(state_code),
+            FOREIGN KEY (fuel_code) REFERENCES fuels(fuel_code),
+            FOREIGN KEY(units) REFERENCES units(units_raw)
+            )
+        ''')
+
         self.cur.execute('''CREATE TABLE IF NOT EXISTS states (
             state_code TEXT PRIMARY KEY NOT NULL,
             state_desc TEXT)''')
@@ -218,6 +751,89 @@ class Database:
             fuel_code TEXT PRIMARY KEY,
             fuel_desc TEXT)''')
 
+        self.cur.execute('''CREATE TABLE IF NOT EXISTS plants (
+            plant_code TEXT PRIMARY KEY,
+            plant_name TEXT,
+            state_code TEXT)''')
+
+        # Keyed (plant, fuel, year) so a plant's history is one index range, not a raw table scan
+        self.cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.plant_table} (
+            plant_code TEXT,
+            fuel_code TEXT,
+            year INTEGER,
+            state_code TEXT,
+            generation REAL,
+            units TEXT,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (plant_code, fuel_code, year),
+            FOREIGN KEY (plant_code) REFERENCES plants(plant_code),
+            FOREIGN KEY (state_code) REFERENCES states(state_code),
+            FOREIGN KEY (fuel_code) REFERENCES fuels(fuel_code),
+            FOREIGN KEY(units) REFERENCES units(units_raw)
+            ) WITHOUT ROWID
+        ''')
+
+        # Change data capture: every insert into / change of clean_generation is appended to
+        # clean_changes by triggers, inside the same transaction as the upsert, tagged with the
+        # open transform run. Neither log table is dropped on reset.
+        self.cur.execute('''CREATE TABLE IF NOT EXISTS transform_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP)''')
+        self.cur.execute("PRAGMA table_info(transform_runs)")
+        if "finished_at" not in {row[1] for row in self.cur.fetchall()}:
+            # Clean DBs created before runs were finished: their runs are all over
+            self.cur.execute("ALTER TABLE transform_runs ADD COLUMN finished_at TIMESTAMP")
+            self.cur.execute("UPDATE transform_runs SET finished_at = started_at")
+
+        self.cur.execute('''CREATE TABLE IF NOT EXISTS clean_changes (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER,
+            year INTEGER,
+            state_code TEXT,
+            fuel_code TEXT,
+            old_generation REAL,
+            new_generation REAL,
+            changed_at TIMESTAMP)''')
+
+        self.cur.execute('''CREATE INDEX IF NOT EXISTS idx_clean_changes_run
+            ON clean_changes(run_id)''')
+
+        # Recreated so clean DBs from before finished_at tag changes with the open run
+        open_run = "(SELECT MAX(run_id) FROM transform_runs WHERE finished_at IS NULL)"
+        self.cur.execute(f"DROP TRIGGER IF EXISTS trg_{self.table}_insert")
+        self.cur.execute(f'''CREATE TRIGGER trg_{self.table}_insert
+            AFTER INSERT ON {self.table}
+            BEGIN
+                INSERT INTO clean_changes
+                (run_id, year, state_code, fuel_code, old_generation, new_generation, changed_at)
+                VALUES ({open_run}, NEW.year, NEW.state_code, NEW.fuel_code,
+                    NULL, NEW.generation, CURRENT_TIMESTAMP);
+            END''')
+
+        self.cur.execute(f"DROP TRIGGER IF EXISTS trg_{self.table}_update")
+        self.cur.execute(f'''CREATE TRIGGER trg_{self.table}_update
+            AFTER UPDATE OF generation ON {self.table}
+            WHEN OLD.generation IS NOT NEW.generation
+            BEGIN
+                INSERT INTO clean_changes
+                (run_id, year, state_code, fuel_code, old_generation, new_generation, changed_at)
+                VALUES ({open_run}, NEW.year, NEW.state_code, NEW.fuel_code,
+                    OLD.generation, NEW.generation, CURRENT_TIMESTAMP);
+            END''')
+
+        # Not dropped on reset so the version keeps increasing and caches never see a reused value
+        self.cur.execute('''CREATE TABLE IF NOT EXISTS clean_metadata (
+            key TEXT PRIMARY KEY,
+            value INTEGER)''')
+        # Random id of this clean DB file: a deleted and rebuilt DB restarts its version at 1,
+        # so caches match entries on (db_id, version)
+        self.cur.execute("INSERT OR IGNORE INTO clean_metadata (key, value) VALUES ('db_id', abs(random()))")
+        if reset is True:
+            # Mapping tables were dropped, so they are rebuilt from the first dimension value
+            self.cur.execute("DELETE FROM clean_metadata WHERE key LIKE 'dimension_watermark:%'")
+
         self.cur.execute(f'''CREATE INDEX IF NOT EXISTS idx_clean_generation_year
             ON {self.table}(year)''')
         
@@ -226,20 +842,39 @@ class Database:
 
         self.cur.execute(f'''CREATE INDEX IF NOT EXISTS idx_clean_generation_state           
             ON {self.table}(state_code)''')
-        
+
+        # Top-N plants per state/year: seek (state, year, fuel) and read in generation order
+        self.cur.execute(f'''CREATE INDEX IF NOT EXISTS idx_plant_generation_state_year
+            ON {self.plant_table}(state_code, year, fuel_code, generation DESC)''')
+
+        self.cur.execute(f'''CREATE INDEX IF NOT EXISTS idx_clean_generation_monthly_fuel_year
+            ON {self.monthly_table}(fuel_code, year, month)''')
+
+        if reset is True:
+            self.bump_clean_version(commit=False)
+
         self.commit()
+        self._mark_schema_ready()
 
 
-    def save_clean_data(self, records: list[dict]):
+    def save_clean_data(self, records):
         """
         Insert clean data into clean_generation table.
         
-        :param records: list of dict
+        :param records: list or iterable of dict
             Each dict must contain the following keys"
                 -   "year", "state_code", "fuel_code", "generation", "units"
+            An iterator is consumed lazily, so records can be streamed without building a list.
+            All records are written in one transaction, which is rolled back if the iterator raises.
+            Outside begin_run / finish_run, the records are logged under a run of their own.
         """
-        for r in records:
-            self.cur.execute(
+        self.cur.execute("SELECT 1 FROM transform_runs WHERE finished_at IS NULL LIMIT 1")
+        own_run = self.cur.fetchone() is None
+        try:
+            if own_run:
+                self.cur.execute("INSERT INTO transform_runs (started_at) VALUES (CURRENT_TIMESTAMP)")
+                own_run = self.cur.lastrowid
+            self.cur.executemany(
                 f"""
                 INSERT INTO {self.table}
                 (year, state_code, fuel_code, generation, units, updated_at)
@@ -248,10 +883,153 @@ class Database:
                     generation = excluded.generation,
                     updated_at = CURRENT_TIMESTAMP
                 """,
-                (r["year"], r["state_code"], r["fuel_code"], r["generation"], r["units"])
+                ((r["year"], r["state_code"], r["fuel_code"], r["generation"], r["units"]) for r in records)
             )
+            if own_run:
+                self.finish_run(own_run, commit=False)
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.bump_clean_version(commit=False)
         self.commit()
 
+    # Spill table for memory-bounded aggregation: partial sums that did not fit in memory are
+    # merged here (per connection, on disk) and read back once the raw scan is complete.
+
+    def spill_partial_aggregates(self, rows):
+        """
+        Append partial (year, state_code, fuel_code, generation, units) sums to the temp spill table.
+        A key may be spilled any number of times; iter_spilled_aggregates adds its rows up.
+        """
+        self.cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS generation_spill (
+            year INTEGER,
+            state_code TEXT,
+            fuel_code TEXT,
+            generation REAL,
+            units TEXT
+            )
+        """)
+        self.cur.executemany(
+            "INSERT INTO generation_spill (year, state_code, fuel_code, generation, units) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def iter_spilled_aggregates(self, batch_size=10000):
+        """
+        Stream merged rows from the spill table in batches. The partial sums of a key are added
+        with the fsum aggregate (ExactSum), so exact partials merge into a correctly rounded total.
+
+        :return: iterator of (year, state_code, fuel_code, generation, units, other_units) tuples;
+            other_units is not None when the key mixed units
+        """
+        self.conn.create_aggregate("fsum", 1, ExactSum)
+        cur = self.conn.cursor()
+        cur.execute("""
+            SELECT year, state_code, fuel_code, fsum(generation), MIN(units), NULLIF(MAX(units), MIN(units))
+            FROM generation_spill
+            GROUP BY year, state_code, fuel_code
+        """)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        cur.close()
+
+    def drop_spill(self):
+        self.cur.execute("DROP TABLE IF EXISTS temp.generation_spill")
+
+    def save_clean_monthly_data(self, records: list[dict]):
+        """
+        Insert clean monthly data into clean_generation_monthly table.
+
+        :param records: list of dict
+            Each dict must contain the following keys:
+                -   "year", "month", "state_code", "fuel_code", "generation", "units"
+        """
+        self.cur.executemany(
+            f"""
+            INSERT INTO {self.monthly_table}
+            (year, month, state_code, fuel_code, generation, units, updated_at)
+            VALUES ( ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (year, month, state_code, fuel_code) DO UPDATE SET
+                generation = excluded.generation,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            [(r["year"], r["month"], r["state_code"], r["fuel_code"], r["generation"], r["units"])
+             for r in records]
+        )
+        self.bump_clean_version(commit=False)
+        self.commit()
+
+    def save_plant_data(self, year: int, rows):
+        """
+        Insert or update plants and their generation for one year.
+
+        :param year: int
+        :param rows: list of (plant_code, plant_name, state_code, fuel_code, generation, units) tuples
+        """
+        self.cur.executemany(
+            """
+            INSERT INTO plants (plant_code, plant_name, state_code) VALUES (?, ?, ?)
+            ON CONFLICT (plant_code) DO UPDATE SET
+                plant_name = excluded.plant_name,
+                state_code = excluded.state_code
+            """,
+            {(code, name, state) for code, name, state, _, _, _ in rows}
+        )
+        self.cur.executemany(
+            f"""
+            INSERT INTO {self.plant_table}
+            (plant_code, fuel_code, year, state_code, generation, units, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (plant_code, fuel_code, year) DO UPDATE SET
+                state_code = excluded.state_code,
+                generation = excluded.generation,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            ((code, fuel, year, state, generation, units) for code, _, state, fuel, generation, units in rows)
+        )
+        self.bump_clean_version(commit=False)
+        self.commit()
+
+    def get_plant_series(self, plant_code: str, fuel_code: str = "ALL"):
+        """
+        Generation history of one plant for one fuel, oldest year first (a primary key range seek).
+
+        :param plant_code: str
+        :param fuel_code: str, fuel code (default "ALL" for the plant total)
+        :return: list of (year, generation) tuples
+        """
+        self.cur.execute(f'''
+            SELECT year, generation
+            FROM {self.plant_table}
+            WHERE plant_code = ? AND fuel_code = ?
+            ORDER BY year
+            ''', (plant_code, fuel_code))
+        return self.cur.fetchall()
+
+    def top_plants(self, state_code: str, year: int, n: int = 10, fuel_code: str = "ALL"):
+        """
+        Largest plants in a state for a year, read in order from idx_plant_generation_state_year.
+
+        :param state_code: str
+        :param year: int
+        :param n: int, number of plants
+        :param fuel_code: str, fuel code (default "ALL" for plant totals)
+        :return: list of (plant_code, plant_name, generation) tuples
+        """
+        self.cur.execute(f'''
+            SELECT g.plant_code, p.plant_name, g.generation
+            FROM {self.plant_table} g
+            JOIN plants p ON p.plant_code = g.plant_code
+            WHERE g.state_code = ? AND g.year = ? AND g.fuel_code = ?
+            ORDER BY g.generation DESC
+            LIMIT ?
+            ''', (state_code, year, fuel_code, n))
+        return self.cur.fetchall()
+
     def load_clean_data(self):
         """
         Loads all clean rows from clean_generation table
@@ -301,21 +1079,220 @@ class Database:
             )
         self.commit()
 
+    def get_mapped_codes(self, name):
+        """
+        Codes present in a mapping table.
+
+        :param name: str, "states", "fuels" or "units"
+        :return: set of str
+        """
+        column = {"states": "state_code", "fuels": "fuel_code", "units": "units_raw"}[name]
+        self.cur.execute(f"SELECT {column} FROM {name}")
+        return {code for (code,) in self.cur.fetchall()}
+
+    def get_clean_metadata(self, key, default=0):
+        """
+        Load an integer value from the clean_metadata table.
+
+        :param key: str, metadata key (e.g. 'version')
+        :param default: value returned when the key does not exist
+        :return: int
+        """
+        self.cur.execute("SELECT value FROM clean_metadata WHERE key = ?", (key,))
+        row = self.cur.fetchone()
+        return row[0] if row else default
+
+    def set_clean_metadata(self, key, value, commit=True):
+        """
+        Insert or update an integer value in the clean_metadata table.
+        """
+        self.cur.execute(
+            """
+            INSERT INTO clean_metadata (key, value) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+            """,
+            (key, value)
+        )
+        if commit:
+            self.commit()
+
+    def get_clean_version(self):
+        """
+        Return the clean DB version counter. It is bumped every time clean_generation is written,
+        so readers can tell whether results cached against an older version are stale.
+        Clean DBs built before clean_metadata existed have no counter yet and report version 0
+        (a read-only handle never runs the DDL that would create it).
+        """
+        try:
+            return self.get_clean_metadata("version")
+        except sqlite3.OperationalError as e:
+            if "no such table" not in str(e):
+                raise
+            return 0
+
+    def get_clean_identity(self):
+        """
+        Return (db_id, version) of the clean DB. The version alone restarts when the DB file is
+        rebuilt; the random db_id set when the DB was created tells the two apart. Both are 0 for
+        clean DBs built before clean_metadata existed.
+        """
+        try:
+            self.cur.execute("SELECT key, value FROM clean_metadata WHERE key IN ('db_id', 'version')")
+        except sqlite3.OperationalError as e:
+            if "no such table" not in str(e):
+                raise
+            return 0, 0
+        values = dict(self.cur.fetchall())
+        return values.get("db_id", 0), values.get("version", 0)
+
+    def bump_clean_version(self, commit=True):
+        """
+        Increment the clean DB version counter and return the new value.
+
+        :param commit: bool, set False to leave the bump inside the caller's transaction
+        """
+        self.cur.execute(
+            """
+            INSERT INTO clean_metadata (key, value) VALUES ('version', 1)
+            ON CONFLICT (key) DO UPDATE SET value = value + 1
+            """
+        )
+        if commit:
+            self.commit()
+        return self.get_clean_version()
+
+    def begin_run(self):
+        """
+        Start a transform run. Changes to clean_generation written from now on are logged under it
+        until finish_run.
+
+        :return: int, the new run id
+        """
+        # The pipeline lock keeps runs from overlapping, so a run still open here crashed
+        self.cur.execute("UPDATE transform_runs SET finished_at = CURRENT_TIMESTAMP WHERE finished_at IS NULL")
+        self.cur.execute("INSERT INTO transform_runs (started_at) VALUES (CURRENT_TIMESTAMP)")
+        run_id = self.cur.lastrowid
+        self.commit()
+        return run_id
+
+    def finish_run(self, run_id, commit=True):
+        """
+        Mark a transform run as finished.
+
+        :param run_id: int, id returned by begin_run
+        :param commit: bool, set False to leave the update inside the caller's transaction
+        """
+        self.cur.execute(
+            "UPDATE transform_runs SET finished_at = CURRENT_TIMESTAMP WHERE run_id = ?", (run_id,)
+        )
+        if commit:
+            self.commit()
+
+    def get_latest_run_id(self):
+        """
+        Id of the most recent transform run, 0 if none has run.
+        """
+        self.cur.execute("SELECT MAX(run_id) FROM transform_runs")
+        return self.cur.fetchone()[0] or 0
+
+    def iter_changes(self, since_change_id=0, batch_size=1000):
+        """
+        Stream clean_generation changes logged after a given change, oldest first.
+
+        Consumers (exports, caches, rollups) store the last change id they processed and pass it
+        back here to receive only what changed since. Change ids are committed in order, so this
+        is safe while a transform run is still writing.
+
+        :param since_change_id: int, only changes after this one are returned
+        :param batch_size: int, rows fetched from SQLite per round trip
+        :return: iterator of (change_id, run_id, year, state_code, fuel_code, old_generation,
+            new_generation) tuples; old_generation is None for newly inserted keys
+        """
+        cur = self.conn.cursor()
+        cur.execute('''
+            SELECT change_id, run_id, year, state_code, fuel_code, old_generation, new_generation
+            FROM clean_changes
+            WHERE change_id > ?
+            ORDER BY change_id
+            ''', (since_change_id,))
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        cur.close()
+
     def pull_year_range(self):
-        years = list()
-        for year in self.cur.execute(f'SELECT year FROM {self.table}'):
-            years.append(int(year[0]))
-        ymax = max(years)
-        ymin = min(years)
+        self.cur.execute(f'SELECT MAX(year), MIN(year) FROM {self.table}')
+        ymax, ymin = self.cur.fetchone()
+        if ymax is None:
+            return None, None   # no clean rows yet
 
-        return ymax, ymin
+        return int(ymax), int(ymin)
     
-    def aggregate_generation(self, year: int):
+    def aggregate_generation(self, year: int, limit: int = None):
+        """
+        Net generation per fuel for a given year (plant totals excluded), largest first.
+
+        :param year: int
+        :param limit: int, optional number of fuels to return (default all)
+        :return: list of (fuel_code, generation) tuples
+        """
         self.cur.execute(f'''
             SELECT fuel_code, SUM(generation) 
             FROM {self.table}
             WHERE year = ? AND fuel_code != "ALL"
             GROUP BY fuel_code
             ORDER BY SUM(generation) DESC
-            ''', (year,))
+            LIMIT ?
+            ''', (year, -1 if limit is None else limit))
+        return self.cur.fetchall()
+
+    def state_generation(self, year: int, fuel_code: str = "ALL"):
+        """
+        Net generation per state for a given year and fuel, largest first.
+
+        :param year: int
+        :param fuel_code: str, fuel code to break down (default "ALL" for plant totals)
+        :return: list of (state_code, generation) tuples
+        """
+        self.cur.execute(f'''
+            SELECT state_code, SUM(generation)
+            FROM {self.table}
+            WHERE year = ? AND fuel_code = ?
+            GROUP BY state_code
+            ORDER BY SUM(generation) DESC
+            ''', (year, fuel_code))
+        return self.cur.fetchall()
+
+    def fuel_generation_by_year(self):
+        """
+        Net generation per year and fuel for every year at once (plant totals excluded).
+
+        :return: list of (year, fuel_code, generation) tuples
+        """
+        self.cur.execute(f'''
+            SELECT year, fuel_code, SUM(generation)
+            FROM {self.table}
+            WHERE fuel_code != 'ALL'
+            GROUP BY year, fuel_code
+            ''')
+        return self.cur.fetchall()
+
+    def state_generation_by_year(self, fuel_code: str = "ALL"):
+        """
+        Net generation per year and state for one fuel, for every year at once.
+
+        :param fuel_code: str, fuel code to break down (default "ALL" for plant totals)
+        :return: list of (year, state_code, generation) tuples
+        """
+        self.cur.execute(f'''
+            SELECT year, state_code, SUM(generation)
+            FROM {self.table}
+            WHERE fuel_code = ?
+            GROUP BY year, state_code
+            ''', (fuel_code,))
         return self.cur.fetchall()
+
+
+atexit.register(Database.close_all)
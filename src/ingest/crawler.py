@@ -1,48 +1,89 @@
+import codecs
+import http.client
 import json
+import threading
 import urllib.parse, urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from src.db import Database
-from src.config import API_KEY, EIA_CONFIG ,get_dataset_url
+from src.config import API_KEY, EIA_CONFIG, get_datasets
+
+# Field mapping and filters used when no dataset config is given (facility-fuel)
+FACILITY_FUEL_FIELDS = {
+    'period': 'period',
+    'plantCode': 'plantCode',
+    'plantName': 'plantName',
+    'fuel2002': 'fuel2002',
+    'fuelTypeDescription': 'fuelTypeDescription',
+    'state': 'state',
+    'stateDescription': 'stateDescription',
+    'primeMover': 'primeMover',
+    'generation': 'generation',
+    'units': 'generation-units',
+}
+FACILITY_FUEL_FILTERS = {'primeMover': 'ALL'}
+
+# Rows written per save_raw_data call while a page is streamed in
+WRITE_BATCH = 1000
+
+# Bytes read from the response per refill of the stdlib reader
+_READ_CHUNK = 64 * 1024
+_WHITESPACE = ' \t\n\r'
+
+# Failures while a page streams in (malformed JSON, dropped connection), as opposed to database errors
+_PAGE_ERRORS = (ValueError, OSError, http.client.HTTPException)
 
 def setup_ingest():
     """
-    Perform setup for the EIA data ingest pipeline. Returns a DB connection.
+    Perform setup for the EIA data ingest pipeline. Returns the datasets to crawl.
 
     - Validates that the API key is present.
-    - Initializes the raw database and its tables.
-    - Constructs the dataset base URL.
+    - Initializes the raw database and the raw table of every configured dataset.
+    - Constructs each dataset's URL.
 
-    :return: Tuple containing:
-        - raw_db (db.Database): Initialized database object for raw data.
-        - base_url (str): Full URL for the EIA dataset.
+    :return: List[dict] - Configured datasets (see config.get_datasets), each with its 'url'.
     :raises ValueError: If API key is missing or invalid.
     """
-    if len(API_KEY) < 40:
+    if not API_KEY or len(API_KEY) < 40:
         raise ValueError('API key missing in .env')
     
-    raw_db = Database("raw")
+    datasets = get_datasets(EIA_CONFIG)
+
+    raw_db = Database.shared("raw")
     raw_db.initialize_raw_tables()
-    base_url = get_dataset_url(EIA_CONFIG, 'facility-fuel')
+    for dataset in datasets:
+        if dataset.get('partition'):
+            continue    # per-year partitions are created as rows arrive
+        raw_db.initialize_dataset_table(
+            dataset['table'], list(dataset['fields']), dataset['unique'], dataset['numeric']
+        )
+
+    return datasets
 
-    return raw_db, base_url
+def _page_url(baseurl, offset, apikey, dataset=None, length=None):
+    dataset = dataset or {}
+    params = {'frequency' : dataset.get('frequency', 'annual')}
+    for i, column in enumerate(dataset.get('data', ['generation'])):
+        params[f'data[{i}]'] = column
+    params['offset'] = offset
+    if length is not None:
+        params['length'] = length
+    params['api_key'] = apikey
+    return baseurl + '?' + urllib.parse.urlencode(params)
 
-def fetch_page(baseurl, offset, apikey):
+def fetch_page(baseurl, offset, apikey, dataset=None, length=None):
     """
     Fetch a single page of data from the EIA API. offset is used for pagination of the API.
 
     :param baseurl: str - The base URL of the dataset endpoint.
     :param offset: int - The row offset for pagination.
     :param apikey: str - Your EIA API key.
+    :param dataset: dict, optional - Dataset config supplying 'frequency' and 'data' (default annual generation).
+    :param length: int, optional - Maximum rows to return (default: API page size).
     :return: Tuple containing:
         - success (bool) - True if the request succeeded and data was parsed.
         - js (dict or None) - Parsed JSON response if successful, None otherwise.
     """
-    params = {
-        'frequency' : 'annual',
-        'data[0]' : 'generation',
-        'offset' : offset,
-        'api_key' : apikey
-    }
-    url = baseurl + '?' + urllib.parse.urlencode(params)
+    url = _page_url(baseurl, offset, apikey, dataset, length)
     try :
         handle = urllib.request.urlopen(url)
         if handle.getcode() != 200 :
@@ -54,35 +95,229 @@ def fetch_page(baseurl, offset, apikey):
         print(f'Error fetching page {url}:', e)
         return False, None
 
-def process_page(page):
+def fetch_page_stream(baseurl, offset, apikey, dataset=None, length=None):
+    """
+    Open a single page of data from the EIA API without reading it. Its rows are parsed as they
+    arrive by iterating the returned PageStream, so a page is never held in memory as a whole.
+
+    :param baseurl: str - The base URL of the dataset endpoint.
+    :param offset: int - The row offset for pagination.
+    :param apikey: str - Your EIA API key.
+    :param dataset: dict, optional - Dataset config supplying 'frequency' and 'data' (default annual generation).
+    :param length: int, optional - Maximum rows to return (default: API page size).
+    :return: Tuple containing:
+        - success (bool) - True if the request succeeded.
+        - page (PageStream or None) - Open page if successful, None otherwise.
+    """
+    url = _page_url(baseurl, offset, apikey, dataset, length)
+    try :
+        handle = urllib.request.urlopen(url)
+        if handle.getcode() != 200 :
+            print(f'Error code={handle.getcode()} at {url}')
+            handle.close()
+            return False, None
+        return True, PageStream(handle)
+    except Exception as e :
+        print(f'Error fetching page {url}:', e)
+        return False, None
+
+def fetch_total(baseurl, apikey, dataset=None):
+    """
+    Fetch the number of rows the API currently reports for a dataset, requesting a single row.
+
+    :param baseurl: str - The base URL of the dataset endpoint.
+    :param apikey: str - Your EIA API key.
+    :param dataset: dict, optional - Dataset config supplying 'frequency' and 'data'.
+    :return: int or None - Reported total, None if the request failed.
+    """
+    success, page = fetch_page(baseurl, 0, apikey, dataset, length=1)
+    if not success or not page:
+        return None
+    return int(page['response']['total'])
+
+# -----------------------------
+# Streaming page parser
+# -----------------------------
+
+class PageStream:
+    """
+    Rows of one API page, parsed incrementally from a binary file-like response.
+
+    Iterating yields the items of response.data one at a time while the body is still being
+    read, so memory stays bounded by one read chunk and one row whatever the page length.
+    The stream is closed once iteration ends.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.total = None   # response.total, set once the parser has passed it
+        self.rows = 0       # items of response.data yielded so far
+
+    def __iter__(self):
+        reader = _JsonReader(self.stream)
+        try:
+            for key in reader.keys():
+                if key != 'response':
+                    reader.value()
+                    continue
+                for key in reader.keys():
+                    if key == 'data':
+                        for item in reader.items():
+                            self.rows += 1
+                            yield item
+                    elif key == 'total':
+                        self.total = int(reader.value())
+                    else:
+                        reader.value()
+        finally:
+            self.stream.close()
+
+class _JsonReader:
+    """
+    Pull reader over a binary JSON stream: walks objects and arrays key by key and decodes
+    everything else with raw_decode, refilling its text buffer from the stream as needed.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.stream.read(_READ_CHUNK)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.utf8.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def _peek(self):
+        # Next non-whitespace character, '' at the end of the stream
+        if self.pos < len(self.buffer) and self.buffer[self.pos] not in _WHITESPACE:
+            return self.buffer[self.pos]     # compact JSON: almost always taken
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill()
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f'Malformed API response: expected {char!r} at "{self.buffer[self.pos:self.pos + 20]}"')
+        self.pos += 1
+
+    def _members(self, close):
+        # Advance to the next member of an object or array; False once it is closed
+        if self._peek() == close:
+            self.pos += 1
+            return False
+        return True
+
+    def _separator(self, close):
+        if self._peek() == ',':
+            self.pos += 1
+        elif self._peek() != close:
+            raise ValueError('Malformed API response: expected "," or closing bracket')
+
+    def value(self):
+        """
+        Decode the next complete JSON value.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number cut off at the end of the buffer decodes too; only trust it with more input behind it
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def keys(self):
+        """
+        Yield the keys of the next object. The caller consumes each key's value before the next one.
+        """
+        self._expect('{')
+        while self._members('}'):
+            key = self.value()
+            self._expect(':')
+            yield key
+            self._separator('}')
+
+    def items(self):
+        """
+        Yield the elements of the next array, decoded one at a time.
+        """
+        self._expect('[')
+        while self._members(']'):
+            yield self.value()
+            self._separator(']')
+
+
+# -----------------------------
+# Page processing
+# -----------------------------
+
+def _fields_and_filters(dataset):
+    if dataset is None:
+        return FACILITY_FUEL_FIELDS, FACILITY_FUEL_FILTERS
+    return dataset['fields'], dataset.get('filters', {})
+
+def process_row(line, fields, filters):
+    """
+    Map one API row to raw table columns.
+
+    :param line: dict - A single item of response.data.
+    :param fields: dict - Raw column -> API field.
+    :param filters: dict - API field -> required value.
+    :return: dict or None - Row keyed by raw column, None if it does not match the filters.
     """
-    Extract relevant raw generation entries from an API response page.
+    if any(line.get(key) != value for key, value in filters.items()):
+        return None
+    return {column: line[key] for column, key in fields.items()}
 
-    Filters out any rows where 'primeMover' is not 'ALL'.
+def process_page(page, dataset=None):
+    """
+    Extract relevant raw entries from an API response page.
+
+    Filters out any rows not matching the dataset's filters (for facility-fuel, rows where
+    'primeMover' is not 'ALL') and renames API fields to raw table columns.
 
     :param page: dict - JSON response from the EIA API for a single page.
-    :return: List[dict] - Each dict represents a cleaned raw row with keys:
+    :param dataset: dict, optional - Dataset config supplying 'fields' and 'filters' (default facility-fuel).
+    :return: List[dict] - Each dict represents a cleaned raw row keyed by raw column. For facility-fuel:
         'period', 'plantCode', 'plantName', 'fuel2002', 'fuelTypeDescription',
         'state', 'stateDescription', 'primeMover', 'generation', 'units'.
     """
-    pulled_data = []
-    for line in page['response']['data']:
-        if line['primeMover'] != 'ALL':
-            continue
-        entry = {
-            'period': line['period'],
-            'plantCode': line['plantCode'],
-            'plantName': line['plantName'],
-            'fuel2002': line['fuel2002'],
-            'fuelTypeDescription': line['fuelTypeDescription'],
-            'state': line['state'],
-            'stateDescription': line['stateDescription'],
-            'primeMover': line['primeMover'],
-            'generation': line['generation'],
-            'units': line['generation-units']
-        }
-        pulled_data.append(entry)
-    return pulled_data
+    fields, filters = _fields_and_filters(dataset)
+    rows = (process_row(line, fields, filters) for line in page['response']['data'])
+    return [row for row in rows if row is not None]
+
+def process_page_batches(page, dataset=None, write_batch=WRITE_BATCH):
+    """
+    Filter and map the rows of a streamed page as they are parsed, in lists of at most write_batch rows.
+
+    :param page: iterable of dict - Items of response.data, e.g. a PageStream.
+    :param dataset: dict, optional - Dataset config supplying 'fields' and 'filters' (default facility-fuel).
+    :param write_batch: int, optional - Maximum rows per batch.
+    :return: Iterator[List[dict]] - Rows keyed by raw column, as from process_page.
+    """
+    fields, filters = _fields_and_filters(dataset)
+    batch = []
+    for line in page:
+        row = process_row(line, fields, filters)
+        if row is not None:
+            batch.append(row)
+            if len(batch) >= write_batch:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
 
 def update_pipeline_offset(db, pipeline, offset):
     """
@@ -96,61 +331,96 @@ def update_pipeline_offset(db, pipeline, offset):
     db.update_metadata(pipeline, offset)
     print(f'Updated {pipeline} offset to {offset}')
 
-def crawl_eia_dataset(baseurl, db, api_key, batch_size=50, max_duplicates=10000):
+def crawl_eia_dataset(baseurl, db, api_key, batch_size=50, max_duplicates=10000, dataset=None, stop_event=None,
+                      write_batch=WRITE_BATCH):
     """
     Crawl the EIA dataset from the API and store results in the raw database.
 
-    Handles pagination, duplicate detection, and metadata updates.
+    Handles pagination, duplicate detection, and metadata updates. Pages are parsed incrementally
+    (see PageStream), so memory does not grow with the page length.
 
     :param baseurl: str - Full URL to the dataset endpoint.
-    :param db: db.Database - Initialized raw database instance.
+    :param db: db.Database - Initialized raw database instance. It is left open; the caller closes it.
     :param api_key: str - Your EIA API key.
     :param batch_size: int, optional - Number of rows between metadata updates (default 50).
     :param max_duplicates: int, optional - Maximum allowed duplicate rows before stopping (default 10000).
-    :return: None
+    :param dataset: dict, optional - Dataset config; selects the raw table, field mapping and
+        crawl_metadata key (default facility-fuel into raw_generation under 'eia_generation').
+    :param stop_event: threading.Event, optional - Set by the caller to stop the crawl after the current page.
+    :param write_batch: int, optional - Rows per insert while a page is streamed (default WRITE_BATCH).
+    :return: int - Number of new rows stored.
+    :raises RuntimeError: If a page could not be fetched or read, or stop_event was set, before the
+        end of the data. The offset is saved first, so the next crawl resumes at that page.
     """
-    offset = db.load_metadata('eia_generation')
+    pipeline = dataset['pipeline'] if dataset else 'eia_generation'
+    table = dataset['table'] if dataset else None
+    columns = list(dataset['fields']) if dataset else None
+    label = f"[{dataset['name']}] " if dataset else ''
+
+    offset = db.load_metadata(pipeline)
     if offset == 0 :
-        print('Starting a new crawl...')
+        print(f'{label}Starting a new crawl...')
     else :
-        print(f'Resuming previous crawl from row {offset:,}')
+        print(f'{label}Resuming previous crawl from row {offset:,}')
     ignored_rows = 0
+    stored_rows = 0
+    error = None
     try:
         while True:
-            # Fetch a page of data
-            success, page = fetch_page(baseurl, offset, api_key)
+            if stop_event is not None and stop_event.is_set():
+                print(f'{label}Crawl stopped.')
+                error = f'Crawl stopped at offset {offset:,}'
+                break
+
+            # Open a page of data; its rows are parsed as they arrive
+            success, page = fetch_page_stream(baseurl, offset, api_key, dataset)
             if not success or not page:
+                error = f'Could not fetch page at offset {offset:,}'
+                break
+
+            # Filter relevant rows and save them in batches while the page streams in
+            try:
+                for pulled_data in process_page_batches(page, dataset, write_batch):
+                    if dataset and dataset.get('partition') == 'year':
+                        new_rows = db.save_partitioned_raw_data(
+                            pulled_data, table, columns, dataset['unique'], dataset.get('numeric', ())
+                        )
+                    else:
+                        new_rows = db.save_raw_data(pulled_data, table, columns)
+                    stored_rows += new_rows
+                    ignored_rows += len(pulled_data) - new_rows
+            except _PAGE_ERRORS as e:
+                # Offset stays at the start of this page; rows already saved are ignored as duplicates on retry
+                print(f'{label}Error reading page at offset {offset:,}:', e)
+                error = f'Error reading page at offset {offset:,}: {e}'
+                break
+
+            if page.total is None:
+                print(f'{label}Response at offset {offset:,} has no row total. Stopping crawl.')
+                error = f'Response at offset {offset:,} has no row total'
                 break
             # Total rows in API dataset
-            totalRows = int(page['response']['total'])
+            totalRows = page.total
 
             # If no data, we've reached the end
-            if not page['response']['data']:
-                print('Reached last page of available data. Crawl successful.')
+            if page.rows == 0:
+                print(f'{label}Reached last page of available data. Crawl successful.')
                 offset = 0
                 break
 
-            # Process page and filter relevant rows    
-            pulled_data = process_page(page)
-            
-            # Save to DB and count duplicates
-            if pulled_data:
-                new_rows = db.save_raw_data(pulled_data)
-                ignored_rows += len(pulled_data) - new_rows
-
             # Update offset for next page
-            offset += len(page['response']['data'])
+            offset += page.rows
 
             # Log process
-            print(f'Crawled through {offset:,} out of {totalRows:,} rows of data.')
+            print(f'{label}Crawled through {offset:,} out of {totalRows:,} rows of data.')
 
             # Periodically save progress
             if offset % batch_size == 0:
-                update_pipeline_offset(db, 'eia_generation', offset)
+                update_pipeline_offset(db, pipeline, offset)
 
             # Stop crawl if too many duplicate rows because we're crawling old data.
             if ignored_rows > max_duplicates:
-                print(f'{ignored_rows} rows of duplicate data crawled. Rerun program when new data is available.')
+                print(f'{label}{ignored_rows} rows of duplicate data crawled. Rerun program when new data is available.')
                 offset = 0
                 break
 
@@ -158,5 +428,47 @@ def crawl_eia_dataset(baseurl, db, api_key, batch_size=50, max_duplicates=10000)
         print('\nProgram interrupted by User...')
 
     finally:
-        update_pipeline_offset(db, 'eia_generation', offset)
-        db.close()
\ No newline at end of file
+        update_pipeline_offset(db, pipeline, offset)
+
+    if error:
+        raise RuntimeError(error)
+    return stored_rows
+
+def crawl_all_datasets(datasets, api_key, max_workers=None, stop_event=None):
+    """
+    Crawl every configured dataset concurrently, one thread and raw DB connection per dataset.
+    The connections are opened for this call and closed when each crawl ends.
+
+    Each dataset keeps its own raw table and offset in crawl_metadata, so one slow or failing
+    dataset does not hold back the others.
+
+    :param datasets: List[dict] - Datasets returned by setup_ingest.
+    :param api_key: str - Your EIA API key.
+    :param max_workers: int, optional - Maximum concurrent crawls (default one per dataset).
+    :param stop_event: threading.Event, optional - Set by the caller to stop every crawl after its
+        current page (default a new event, set on KeyboardInterrupt).
+    :return: Tuple containing:
+        - new_rows (dict) - New rows stored per dataset name, for crawls that reached the end of the data.
+        - errors (dict) - Error message per dataset name, for crawls that failed.
+    """
+    stop_event = stop_event or threading.Event()
+
+    def crawl(dataset):
+        # sqlite3 connections cannot be shared across threads, so each crawl opens its own
+        with Database("raw") as db:
+            return crawl_eia_dataset(dataset['url'], db, api_key, dataset=dataset, stop_event=stop_event)
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(datasets), 1)) as pool:
+        futures = {dataset['name']: pool.submit(crawl, dataset) for dataset in datasets}
+        try:
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f'[{name}] Crawl failed:', e)
+                    errors[name] = f'{type(e).__name__}: {e}'
+        except KeyboardInterrupt:
+            print('\nProgram interrupted by User...')
+            stop_event.set()
+    return results, errors
\ No newline at end of file
@@ -0,0 +1,232 @@
+import argparse
+import io
+import json
+import math
+import os
+
+import numpy as np
+
+from src.db import Database
+from src.ingest.crawler import FACILITY_FUEL_FIELDS, PageStream
+
+# Rows per page the EIA API returns when no length is requested
+API_PAGE_LENGTH = 5000
+
+
+class SyntheticEIA:
+    """
+    Deterministic, facility-fuel shaped data for scale testing without the EIA API.
+
+    Every plant sits in one state and burns a fixed set of fuels, and each plant-year has one
+    row per fuel plus an "ALL" row holding their sum, as in the real dataset. Cardinalities
+    default to the real ones (about 12k plants, 55 states, 30 fuels, 25 years). Generation is
+    skewed: plant sizes are log-normal, fuels and states follow Zipf-like popularity, and each
+    fuel has its own long-term growth rate.
+
+    Rows are ordered by year, then plant, then fuel, and every year is drawn from its own seed,
+    so any slice (a page at some offset, a resumed build) is reproducible on its own. The same
+    arguments always give the same rows.
+    """
+
+    def __init__(self, rows=None, plants=12_000, states=55, fuels=30, years=25, start_year=2000, seed=0):
+        """
+        :param rows: int, optional number of rows to produce (default every row the plants have).
+            When the plants cannot fill this many rows, more plants are added.
+        :param plants: int, number of plants (a minimum when rows is given)
+        :param states: int, number of states
+        :param fuels: int, number of fuel codes besides "ALL"
+        :param years: int, number of annual periods
+        :param start_year: int, first period
+        :param seed: int, random seed
+        :raises ValueError: if a count is not positive
+        """
+        if min(plants, states, fuels, years) < 1:
+            raise ValueError("plants, states, fuels and years must all be positive.")
+        self.states, self.fuels, self.years = states, fuels, years
+        self.start_year, self.seed = start_year, seed
+
+        self._build_plants(plants)
+        if rows is not None and rows > self.capacity:
+            # Fuel counts are random, so grow with headroom until the plants cover rows
+            while rows > self.capacity:
+                self._build_plants(math.ceil(self.plants * rows / self.capacity * 1.01))
+        self.total = self.capacity if rows is None else rows
+        self._cached_year = None
+
+    def _build_plants(self, plants):
+        rng = np.random.default_rng([self.seed, plants])
+        self.plants = plants
+
+        state_weights = 1 / np.arange(1, self.states + 1) ** 0.8
+        plant_state = rng.choice(self.states, size=plants, p=state_weights / state_weights.sum())
+
+        # Most plants burn one or two fuels, a few burn many
+        fuel_weights = 1 / np.arange(1, self.fuels + 1) ** 1.2
+        fuel_weights /= fuel_weights.sum()
+        fuel_counts = np.minimum(rng.geometric(0.5, size=plants), self.fuels)
+
+        # Weighted sampling without replacement for every plant at once (Gumbel top-k): a plant
+        # burns the fuels whose perturbed log-weight ranks within its fuel count
+        keys = np.log(fuel_weights) + rng.gumbel(size=(plants, self.fuels))
+        rank = np.argsort(np.argsort(-keys, axis=1), axis=1)
+        burns = np.ones((plants, self.fuels + 1), dtype=bool)     # last column: the ALL row
+        burns[:, :-1] = rank < fuel_counts[:, None]
+
+        # Per-row layout of one year: each plant's fuel rows, then its ALL row (fuel index 0)
+        self._row_plant, column = np.nonzero(burns)
+        self._row_fuel = np.where(column == self.fuels, 0, column + 1)
+        self._is_total = self._row_fuel == 0
+        self._total_rows = np.flatnonzero(self._is_total)
+        self._first_fuel_rows = np.concatenate(([0], self._total_rows[:-1] + 1))
+
+        # Base generation of each plant-fuel row: log-normal plant size split across its fuels
+        size = rng.lognormal(mean=11.0, sigma=1.8, size=plants)
+        split = rng.gamma(1.0, size=len(self._row_fuel))
+        split[self._is_total] = 0
+        shares = split / np.add.reduceat(split, self._first_fuel_rows)[self._row_plant]
+        self._base = size[self._row_plant] * shares
+        self._growth = rng.normal(0.0, 0.06, size=self.fuels + 1)
+
+        self._plant_codes = [str(p + 1) for p in range(plants)]
+        self._plant_state = plant_state.tolist()
+        self._row_plant_list = self._row_plant.tolist()
+        self._row_fuel_list = self._row_fuel.tolist()
+        self._cached_year = None
+
+    @property
+    def rows_per_year(self):
+        return len(self._row_fuel)
+
+    @property
+    def capacity(self):
+        return self.rows_per_year * self.years
+
+    def _year_generation(self, year_index):
+        if self._cached_year is not None and self._cached_year[0] == year_index:
+            return self._cached_year[1]
+        rng = np.random.default_rng([self.seed, self.plants, year_index])
+        trend = np.exp(self._growth[self._row_fuel] * year_index)
+        generation = self._base * trend * rng.lognormal(0.0, 0.2, size=self.rows_per_year)
+        generation[self._total_rows] = np.add.reduceat(generation, self._first_fuel_rows)
+        generation = np.round(generation, 3).tolist()
+        self._cached_year = (year_index, generation)
+        return generation
+
+    # -----------------------------
+    # Rows
+    # -----------------------------
+
+    def iter_rows(self, start=0, stop=None):
+        """
+        Yield raw rows (dicts keyed by RAW_COLUMNS) from position start up to stop.
+
+        :param start: int, first row
+        :param stop: int, optional end row, exclusive (default total)
+        """
+        stop = self.total if stop is None else min(stop, self.total)
+        per_year = self.rows_per_year
+        position = start
+        while position < stop:
+            year_index, lo = divmod(position, per_year)
+            hi = min(per_year, lo + stop - position)
+            generation = self._year_generation(year_index)
+            period = str(self.start_year + year_index)
+            for i in range(lo, hi):
+                plant = self._row_plant_list[i]
+                fuel = self._row_fuel_list[i]
+                state = self._plant_state[plant]
+                yield {
+                    "period": period,
+                    "plantCode": self._plant_codes[plant],
+                    "plantName": f"Plant {self._plant_codes[plant]}",
+                    "fuel2002": f"F{fuel:02d}" if fuel else "ALL",
+                    "fuelTypeDescription": f"Fuel {fuel:02d}" if fuel else "All Fuels",
+                    "state": f"S{state:02d}",
+                    "stateDescription": f"State {state:02d}",
+                    "primeMover": "ALL",
+                    "generation": generation[i],
+                    "units": "megawatthours",
+                }
+            position += hi - lo
+
+    def batches(self, batch_size=100_000, start=0):
+        """
+        Yield lists of at most batch_size raw rows, from position start to the end.
+        """
+        for lo in range(start, self.total, batch_size):
+            yield list(self.iter_rows(lo, lo + batch_size))
+
+    def write_raw(self, db, batch_size=100_000, start=0):
+        """
+        Insert rows into a raw database through save_raw_data.
+
+        :param db: db.Database, initialized raw database
+        :param batch_size: int, rows per insert transaction
+        :param start: int, first row to write (to resume a partial build)
+        :return: int, number of new rows stored
+        """
+        inserted = 0
+        for batch in self.batches(batch_size, start):
+            inserted += db.save_raw_data(batch)
+        return inserted
+
+    # -----------------------------
+    # Mock API
+    # -----------------------------
+
+    def page(self, offset, length=API_PAGE_LENGTH):
+        """
+        Build an EIA API response page (API field names, string total) at offset.
+
+        :param offset: int, row offset
+        :param length: int, maximum rows in the page
+        :return: dict
+        """
+        data = [
+            {key: row[column] for column, key in FACILITY_FUEL_FIELDS.items()}
+            for row in self.iter_rows(offset, offset + length)
+        ]
+        return {"response": {"total": str(self.total), "data": data}}
+
+    def fetch_page(self, baseurl, offset, apikey, dataset=None, length=None):
+        """
+        Drop-in replacement for crawler.fetch_page serving synthetic pages, e.g. to run a crawl
+        end to end without the network.
+        """
+        return True, self.page(offset, length or API_PAGE_LENGTH)
+
+    def fetch_page_stream(self, baseurl, offset, apikey, dataset=None, length=None):
+        """
+        Drop-in replacement for crawler.fetch_page_stream: the page is serialized to JSON and
+        parsed back through PageStream, as a response body would be.
+        """
+        body = json.dumps(self.page(offset, length or API_PAGE_LENGTH)).encode()
+        return True, PageStream(io.BytesIO(body))
+
+
+# -----------------------------
+# Main Runner
+# -----------------------------
+
+def main():
+    """
+    Standalone runner: build (or top up) a synthetic raw database.
+    """
+    parser = argparse.ArgumentParser(description="Write synthetic facility-fuel rows to a raw SQLite file")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", default="data/synthetic_raw.sqlite", help="Raw SQLite file to write")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or ".", exist_ok=True)
+    with Database("raw", path=args.db) as raw:
+        raw.initialize_raw_tables()
+        start = raw.get_max_raw_id()
+        generator = SyntheticEIA(rows=args.rows, seed=args.seed)
+        print(f"{generator.plants:,} plants, {generator.rows_per_year:,} rows per year")
+        inserted = generator.write_raw(raw, start=min(start, generator.total))
+    print(f"Stored {inserted:,} new rows in {args.db}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,88 @@
 import argparse
+import json
 
-from src.ingest.crawler import setup_ingest, crawl_eia_dataset
+from src.ingest.crawler import setup_ingest, crawl_all_datasets, fetch_total
 from src.transform.clean import (
     setup_transform,
     build_state_mapping,
     build_units_mapping,
     build_fuels_mapping,
     aggregate_generation,
+    aggregate_generation_parallel,
+    aggregate_generation_years,
+    aggregate_monthly_generation,
+    build_plant_generation,
 )
-from src.analysis.visualize import main as visualize_main  # Import the visualization runner
-from src.config import API_KEY
+from src.validate.quality import validate_raw_data
+from src.scheduler import PipelineDaemon, PipelineLock, load_stats
+from src.db import Database
+from src.config import API_KEY, EIA_CONFIG, DAEMON_CONFIG, get_datasets
 
 
 # -----------------------------
 # Ingest
 # -----------------------------
 def run_ingest():
-    raw_db, base_url = setup_ingest()
-    crawl_eia_dataset(base_url, raw_db, API_KEY)
+    datasets = setup_ingest()
+    crawl_all_datasets(datasets, API_KEY)
+
+
+# -----------------------------
+# Validate
+# -----------------------------
+def run_validate(raw_db=None):
+    if raw_db is None:
+        raw_db = Database.shared("raw")
+        raw_db.initialize_raw_tables()
+
+    counts = validate_raw_data(raw_db)
+    quarantined = sum(counts.values())
+    if quarantined:
+        details = ', '.join(f'{name}={n:,}' for name, n in counts.items() if n)
+        print(f'Quarantined {quarantined:,} raw rows ({details}).')
+    else:
+        print('No new data quality issues found.')
 
 
 # -----------------------------
 # Transform
 # -----------------------------
-def run_transform():
-    raw_db, clean_db = setup_transform()
+def _raw_tables(raw_db, monthly):
+    # Annual raw table plus every monthly partition
+    tables = [raw_db.table]
+    for dataset in monthly:
+        tables += [name for _, name in raw_db.list_partitions(dataset['table'])]
+    return tables
+
+def transform_pending(raw_db, clean_db):
+    """
+    True when a raw table has rows above the watermark of the last transform, e.g. rows stored
+    by a run whose transform failed.
+    """
+    monthly = [d for d in get_datasets(EIA_CONFIG) if d['partition'] == 'year']
+    return any(
+        raw_db.get_max_raw_id(table) > clean_db.get_clean_metadata(f'raw_watermark:{table}')
+        for table in _raw_tables(raw_db, monthly)
+    )
+
+def run_transform(workers=1, incremental=False, raw_db=None, clean_db=None):
+    """
+    Build mapping tables and aggregate raw data into the clean tables.
+
+    :param workers: int, processes used for the annual aggregation
+    :param incremental: bool, only re-aggregate years / partitions with raw rows added since the last transform
+    :param raw_db, clean_db: optional open handles to use instead of the process's shared ones
+    """
+    if raw_db is None:
+        raw_db, clean_db = setup_transform()
+    monthly = [d for d in get_datasets(EIA_CONFIG) if d['partition'] == 'year']
+    tables = _raw_tables(raw_db, monthly)
+
+    run_id = clean_db.begin_run()
+    print(f'Starting transform run {run_id}...')
+
+    # Raw ids only grow, so the highest id seen per table marks what has been transformed
+    watermarks = {t: raw_db.get_max_raw_id(t) for t in tables}
 
     print('Generating mapping tables...')
     build_state_mapping(raw_db, clean_db)
@@ -33,11 +91,79 @@ def run_transform():
     print('Mapping completed successfully.')
 
     print('Aggregating raw data into usable table...')
-    aggregate_generation(raw_db, clean_db)
+    years = None
+    if incremental:
+        since = clean_db.get_clean_metadata(f'raw_watermark:{raw_db.table}')
+        years = raw_db.get_raw_years(since_id=since) if watermarks[raw_db.table] > since else []
+        if workers > 1 and years:
+            aggregate_generation_parallel(raw_db, clean_db, workers, years)
+        else:
+            aggregate_generation_years(raw_db, clean_db, years)
+    elif workers > 1:
+        aggregate_generation_parallel(raw_db, clean_db, workers)
+    else:
+        aggregate_generation(raw_db, clean_db)
+
+    print('Building plant-level table...')
+    build_plant_generation(raw_db, clean_db, years)
+
+    for dataset in monthly:
+        years = None
+        if incremental:
+            years = [
+                year for year, name in raw_db.list_partitions(dataset['table'])
+                if watermarks[name] > clean_db.get_clean_metadata(f'raw_watermark:{name}')
+            ]
+        aggregate_monthly_generation(raw_db, clean_db, dataset['table'], years, dataset['annual_rollup'])
+
+    for table, watermark in watermarks.items():
+        clean_db.set_clean_metadata(f'raw_watermark:{table}', watermark)
+    clean_db.finish_run(run_id)
     print('Data aggregated successfully.')
 
-    raw_db.close()
-    clean_db.close()
+
+# -----------------------------
+# Daemon
+# -----------------------------
+def run_daemon(interval_seconds, workers=1):
+    datasets = setup_ingest()
+    raw_db, clean_db = setup_transform()
+    last_totals = {}    # upstream row total of each dataset's last complete crawl
+    polled_totals = {}
+
+    def poll():
+        changed = []
+        for dataset in datasets:
+            total = fetch_total(dataset['url'], API_KEY, dataset)
+            if total is not None and total != last_totals.get(dataset['name']):
+                polled_totals[dataset['name']] = total
+                changed.append(dataset)
+        return changed
+
+    def ingest(changed, stop_event):
+        new_rows, errors = crawl_all_datasets(changed, API_KEY, stop_event=stop_event)
+        # Failed or interrupted crawls keep their old total, so the next poll crawls them again
+        for name in new_rows:
+            last_totals[name] = polled_totals[name]
+        return new_rows, errors
+
+    def transform():
+        run_validate(raw_db)
+        run_transform(workers, incremental=True, raw_db=raw_db, clean_db=clean_db)
+
+    daemon = PipelineDaemon(
+        poll=poll,
+        ingest=ingest,
+        pending=lambda: transform_pending(raw_db, clean_db),
+        transform=transform,
+        interval_seconds=interval_seconds,
+        lock_path=DAEMON_CONFIG["lock_path"],
+        stats_path=DAEMON_CONFIG["stats_path"],
+    )
+    try:
+        daemon.run_forever()
+    finally:
+        Database.close_all()
 
 
 # -----------------------------
@@ -58,36 +184,112 @@ def main():
         help="Transform raw data into clean tables"
     )
 
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Run data quality checks on newly ingested raw rows (also runs before --transform)"
+    )
+
     parser.add_argument(
         "--visualize",
         action="store_true",
         help="Plot top 10 fuel generation for a given year"
     )
 
+    parser.add_argument(
+        "--trends",
+        action="store_true",
+        help="Summarize and plot fuel and state generation trends across all years"
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to aggregate raw data by year during the transform"
+    )
+
     parser.add_argument(
         "--all",
         action="store_true",
         help="Run ingest, transform, and visualization steps"
     )
 
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running: poll for new EIA data, then ingest and incrementally transform"
+    )
+
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=DAEMON_CONFIG["interval_seconds"],
+        help="Seconds between daemon polls"
+    )
+
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Serve read-only year/state/fuel totals from the clean database over HTTP"
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=None,
+        help="Port for --serve (default from config.yaml)"
+    )
+
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="Print stats of the last daemon run"
+    )
+
     args = parser.parse_args()
 
-    if not (args.ingest or args.transform or args.visualize or args.all):
+    if args.status:
+        print(json.dumps(load_stats(DAEMON_CONFIG["stats_path"]), indent=2))
+        return
+
+    if args.daemon:
+        run_daemon(args.interval, args.workers)
+        return
+
+    if args.serve:
+        from src.service.server import main as serve_main
+        serve_main(args.port)
+        return
+
+    if not (args.ingest or args.validate or args.transform or args.visualize or args.trends or args.all):
         parser.print_help()
         return
 
-    if args.all or args.ingest:
-        print("\n--- INGEST STEP ---")
-        run_ingest()
+    if args.all or args.ingest or args.validate or args.transform:
+        with PipelineLock(DAEMON_CONFIG["lock_path"]):
+            if args.all or args.ingest:
+                print("\n--- INGEST STEP ---")
+                run_ingest()
+
+            if args.all or args.validate or args.transform:
+                print("\n--- VALIDATE STEP ---")
+                run_validate()
 
-    if args.all or args.transform:
-        print("\n--- TRANSFORM STEP ---")
-        run_transform()
+            if args.all or args.transform:
+                print("\n--- TRANSFORM STEP ---")
+                run_transform(args.workers)
 
     if args.all or args.visualize:
         print("\n--- VISUALIZATION STEP ---")
+        from src.analysis.visualize import main as visualize_main  # matplotlib is only imported when plotting
         visualize_main()
 
+    if args.trends:
+        print("\n--- TRENDS STEP ---")
+        from src.analysis.trends import main as trends_main
+        trends_main()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,176 @@
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+
+# -----------------------------
+# Run Lock
+# -----------------------------
+
+class PipelineLock:
+    """
+    Exclusive, non-blocking file lock held for the duration of a pipeline run, so a cron run
+    and the daemon (or two cron runs) never ingest or transform at the same time.
+    The lock is released by the OS if the process dies.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.handle = open(self.path, "a+")
+        self.handle.seek(0)
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self.handle.close()
+            self.handle = None
+            raise RuntimeError(f"Another pipeline run holds the lock at {self.path}")
+
+        self.handle.truncate()
+        self.handle.write(str(os.getpid()))
+        self.handle.flush()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if fcntl is not None:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+        else:
+            self.handle.seek(0)
+            msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+        self.handle.close()
+        self.handle = None
+
+
+# -----------------------------
+# Stats
+# -----------------------------
+
+def load_stats(stats_path):
+    """
+    Load the stats written by the daemon, or None if it has not run yet.
+    """
+    try:
+        with open(stats_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _write_stats(stats_path, stats):
+    # Write then rename so readers never see a half-written file
+    Path(stats_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{stats_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(stats, f, indent=2)
+    os.replace(tmp_path, stats_path)
+
+
+# -----------------------------
+# Daemon
+# -----------------------------
+
+class PipelineDaemon:
+    """
+    Long-running scheduler: every interval it polls for new EIA data, ingests only the datasets
+    that changed and runs the incremental transform whenever raw rows are waiting for it, so rows
+    stored by a cycle whose transform failed are picked up by the next one.
+
+    The pipeline steps are passed in as callables so the daemon owns the schedule, locking and
+    stats while main.py owns the (long-lived) database handles.
+    """
+
+    def __init__(self, poll, ingest, pending, transform, interval_seconds, lock_path, stats_path):
+        """
+        :param poll: callable() -> list of datasets with new data upstream
+        :param ingest: callable(datasets, stop_event) -> tuple of (dict of new rows stored per
+            dataset name, dict of error messages per dataset whose crawl failed). stop_event is set
+            on SIGINT/SIGTERM; ingest should stop crawling when it is.
+        :param pending: callable() -> bool, True while raw rows have not been transformed
+        :param transform: callable() run when pending() is True
+        :param interval_seconds: int, seconds between polls
+        :param lock_path: str, file locked while a cycle runs
+        :param stats_path: str, JSON file the last-run stats are written to
+        """
+        self.poll = poll
+        self.ingest = ingest
+        self.pending = pending
+        self.transform = transform
+        self.interval_seconds = interval_seconds
+        self.lock_path = lock_path
+        self.stats_path = stats_path
+        self.stop_event = threading.Event()
+        self.stats = load_stats(stats_path) or {"runs": 0, "transforms": 0, "errors": 0, "last_run": None}
+
+    def run_once(self):
+        """
+        Run a single poll / ingest / transform cycle under the pipeline lock and record its stats.
+
+        :return: dict, stats of this run
+        """
+        started = time.monotonic()
+        run = {
+            "started_at": datetime.now().isoformat(sep=" ", timespec="seconds"),
+            "changed_datasets": [],
+            "new_rows": {},
+            "transformed": False,
+            "error": None,
+        }
+        try:
+            with PipelineLock(self.lock_path):
+                changed = self.poll()
+                run["changed_datasets"] = [d["name"] for d in changed]
+                if changed:
+                    run["new_rows"], errors = self.ingest(changed, self.stop_event)
+                    if errors:
+                        # Datasets that did crawl are still transformed below
+                        run["error"] = "; ".join(f"[{name}] {error}" for name, error in errors.items())
+                # A stop request skips the transform; the next start picks the rows up
+                if not self.stop_event.is_set() and self.pending():
+                    self.transform()
+                    run["transformed"] = True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            run["error"] = f"{run['error']}; {error}" if run["error"] else error
+
+        run["duration_seconds"] = round(time.monotonic() - started, 3)
+        self.stats["runs"] += 1
+        self.stats["errors"] += int(run["error"] is not None)
+        self.stats["transforms"] += int(run["transformed"])
+        self.stats["last_run"] = run
+        _write_stats(self.stats_path, self.stats)
+        return run
+
+    def run_forever(self):
+        """
+        Run cycles every interval until SIGINT/SIGTERM.
+        """
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: self.stop_event.set())
+
+        print(f"Pipeline daemon started, polling every {self.interval_seconds}s.")
+        while not self.stop_event.is_set():
+            run = self.run_once()
+            if run["error"]:
+                print(f"Run failed: {run['error']}")
+            else:
+                print(
+                    f"Run finished in {run['duration_seconds']}s: "
+                    f"{sum(run['new_rows'].values()):,} new rows, transformed={run['transformed']}"
+                )
+            self.stop_event.wait(self.interval_seconds)
+        print("Pipeline daemon stopped.")
@@ -0,0 +1,203 @@
+import json
+import queue
+import sqlite3
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from src.config import SERVICE_CONFIG
+from src.db import Database
+
+
+# -----------------------------
+# Connection Pool
+# -----------------------------
+
+class ReadOnlyPool:
+    """
+    Fixed-size pool of read-only clean Database handles.
+
+    Handles are opened through a mode=ro URI with query_only set, so the service can never
+    write. The clean DB runs in WAL mode, so these readers do not block (or get blocked by) a
+    transform writing at the same time. Each handle keeps its own statement cache, so the
+    Database query strings are prepared once per handle and reused.
+    """
+
+    def __init__(self, path=None, size=8):
+        self.size = size
+        self._idle = queue.Queue()
+        for _ in range(size):
+            # Request threads take turns on a handle, so it may be used from any of them
+            db = Database("clean", path=path, read_only=True, check_same_thread=False)
+            db.conn.execute("PRAGMA query_only = ON")
+            self._idle.put(db)
+
+    @contextmanager
+    def handle(self):
+        db = self._idle.get()
+        try:
+            yield db
+        finally:
+            self._idle.put(db)
+
+    def close(self):
+        for _ in range(self.size):
+            self._idle.get().close()
+
+
+# -----------------------------
+# Queries
+# -----------------------------
+
+class CleanQueries:
+    """
+    JSON views of the clean Database queries served by the endpoints.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def etag(self, db):
+        # The version restarts when the clean DB is rebuilt, so the tag carries its db_id too
+        db_id, version = db.get_clean_identity()
+        return f'"{db_id}-v{version}"'
+
+    def year_range(self, db):
+        ymax, ymin = db.pull_year_range()
+        return {"min": ymin, "max": ymax}
+
+    def top_fuels(self, db, year, n):
+        rows = db.aggregate_generation(year, limit=n)
+        return [{"fuel_code": code, "generation": total} for code, total in rows]
+
+    def states(self, db, year, fuel_code):
+        rows = db.state_generation(year, fuel_code)
+        return [{"state_code": code, "generation": total} for code, total in rows]
+
+
+# -----------------------------
+# HTTP Handler
+# -----------------------------
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    GET endpoints:
+        /years                          -> {"min": 2001, "max": 2024}
+        /fuels/top?year=2020&n=10       -> top-N fuels by generation for a year
+        /states?year=2020&fuel=ALL      -> generation per state for a year and fuel
+
+    Every response carries an ETag of the clean DB id and version; a matching If-None-Match
+    gets a 304 without running the query.
+    """
+    protocol_version = "HTTP/1.1"   # keep-alive
+    disable_nagle_algorithm = True  # headers and body are written separately; don't wait on delayed ACKs
+    quiet = False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        queries = self.server.queries
+
+        try:
+            with queries.pool.handle() as db:
+                etag = queries.etag(db)
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, None, etag)
+                    return
+
+                if url.path == "/years":
+                    body = queries.year_range(db)
+                elif url.path == "/fuels/top":
+                    n = _int_param(params, "n", 10)
+                    if n < 1:
+                        raise ValueError(f"Invalid n: {n}. Must be at least 1.")
+                    body = queries.top_fuels(db, _int_param(params, "year"), n)
+                elif url.path == "/states":
+                    fuel = params.get("fuel", ["ALL"])[0]
+                    body = queries.states(db, _int_param(params, "year"), fuel)
+                else:
+                    self._send(404, {"error": f"Unknown endpoint: {url.path}"})
+                    return
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        except sqlite3.Error as e:
+            self._send(500, {"error": f"Database error: {e}"})
+            return
+
+        self._send(200, body, etag)
+
+    def _send(self, status, body, etag=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def _int_param(params, name, default=None):
+    values = params.get(name)
+    if not values:
+        if default is None:
+            raise ValueError(f"Missing query parameter: {name}")
+        return default
+    try:
+        return int(values[0])
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {values[0]}. Must be a number.")
+
+
+# -----------------------------
+# Server
+# -----------------------------
+
+def create_server(path=None, host=None, port=None, pool_size=None, quiet=False):
+    """
+    Build a threaded HTTP server over the clean database. Call serve_forever() to run it
+    and server_close() + server.queries.pool.close() to shut it down.
+
+    :param path: str, clean SQLite file (default from config.yaml)
+    :param host: str, bind address (default from config.yaml)
+    :param port: int, bind port; 0 picks a free port (default from config.yaml)
+    :param pool_size: int, read-only connections in the pool (default from config.yaml)
+    :param quiet: bool, suppress per-request logging
+    :return: ThreadingHTTPServer
+    """
+    pool = ReadOnlyPool(path, pool_size or SERVICE_CONFIG["pool_size"])
+    handler = type("Handler", (QueryHandler,), {"quiet": quiet})
+    server = ThreadingHTTPServer(
+        (host or SERVICE_CONFIG["host"], SERVICE_CONFIG["port"] if port is None else port),
+        handler
+    )
+    server.daemon_threads = True
+    server.queries = CleanQueries(pool)
+    return server
+
+
+def main(port=None):
+    """
+    Standalone runner for the query service.
+    """
+    server = create_server(port=port)
+    host, port = server.server_address[:2]
+    print(f"Serving clean generation data on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.server_close()
+        server.queries.pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,249 @@
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from src.db import Database
+from src.db.repository import exact_terms, parse_period
+from src.config import TRANSFORM_CONFIG
+from src.validate.quality import KNOWN_UNITS
 
 def setup_transform():
-    raw_db = Database("raw")
-    clean_db = Database("clean")
+    # Shared handles: DDL runs once per process, and later steps of the same run reuse the connections
+    raw_db = Database.shared("raw")
+    raw_db.initialize_raw_tables()  # ensures the quarantine table exists for older raw DBs
+    clean_db = Database.shared("clean")
     clean_db.initialize_clean_tables(False) # Set "True" to reset tables
 
     return raw_db, clean_db
 
 # ----- Mapping -------
 
+# The raw DB tracks distinct state / fuel / unit values in dimension tables as rows are ingested
+# (see Database.save_raw_data). Each mapping only reads values added since the last transform,
+# using the highest dimension id consumed (kept in clean_metadata), so its cost does not depend
+# on the size of the raw tables. The raw DB's db_id is stored next to each watermark: a rebuilt
+# raw DB numbers its dimension values from 1 again, so its watermarks start over.
+
+def _sync_dimension(raw_db, clean_db, name, build, insert):
+    table = raw_db.dimension_tables[name]
+    key = f'dimension_watermark:{table}'
+    source_key = f'dimension_source:{table}'
+    raw_id = raw_db.get_raw_metadata('db_id')
+    watermark = clean_db.get_clean_metadata(key)
+    if clean_db.get_clean_metadata(source_key) != raw_id:
+        watermark = 0
+    rows = raw_db.get_dimension_values(name, watermark)
+    if rows:
+        insert(build((code, desc) for _, code, desc in rows))
+        watermark = rows[-1][0]
+    clean_db.set_clean_metadata(key, watermark, commit=False)
+    clean_db.set_clean_metadata(source_key, raw_id)
+
 def build_state_mapping(raw_db, clean_db):
-    states = {}
-    for code, desc in raw_db.get_raw_states():
-        if code == "PR":
-            states[code] = 'Puerto Rico'
-        else:
-            states[code] = desc
+    def build(values):
+        states = {}
+        for code, desc in values:
+            if code is None:
+                continue
+            if code == "PR":
+                states[code] = 'Puerto Rico'
+            else:
+                states[code] = desc
+        return states
 
-    clean_db.insert_states(states)
+    _sync_dimension(raw_db, clean_db, "states", build, clean_db.insert_states)
 
 def build_units_mapping(raw_db, clean_db):
-    units = {}
-    for unit in raw_db.get_raw_units():
-        if unit == "megawatthours":
+    def build(values):
+        units = {}
+        for unit, _ in values:
+            if unit not in KNOWN_UNITS:
+                continue    # rows with these units are quarantined by validation
             units[unit] = "MWh"
-        else:
-            raise ValueError(f"Unknown unit: {unit}")
-    
-    clean_db.insert_units(units)
+        return units
+
+    _sync_dimension(raw_db, clean_db, "units", build, clean_db.insert_units)
 
 def build_fuels_mapping(raw_db, clean_db):
-    fuels = {}
-    for code, desc in raw_db.get_raw_fuels():
-        clean_desc = (
-            str.title(desc)
-            .replace(" And ", " & ")
-            .replace("Municiapl", "Municipal")
-        )
-        fuels[code] = clean_desc
+    def build(values):
+        fuels = {}
+        for code, desc in values:
+            if code is None or not desc:
+                continue    # orphan fuels are quarantined by validation
+            clean_desc = (
+                str.title(desc)
+                .replace(" And ", " & ")
+                .replace("Municiapl", "Municipal")
+            )
+            fuels[code] = clean_desc
+        return fuels
 
-    clean_db.insert_fuels(fuels)
+    _sync_dimension(raw_db, clean_db, "fuels", build, clean_db.insert_fuels)
 
 # ------- Load --------
 
-# create a dict() that has format { (year, state_code, fuel_code) , (generation, units) }
+# Aggregates into a dict of { (year, state_code, fuel_code) : _Accumulator(terms, units) }.
+# When the dict reaches the memory budget its partial sums are spilled to a temp table in the
+# clean DB and the dict starts over; records are streamed to save_clean_data instead of being
+# collected in a list first.
+#
+# Sums are exact: an accumulator keeps a short list of floats whose exact sum is the running
+# total, and the final value is their math.fsum. Every path (serial, spilled, per-year parallel
+# or incremental) therefore writes the same correctly rounded totals, so switching between them
+# never rewrites clean_generation with last-bit differences.
+
+# Rough per-key cost of the dict entry, key tuple and accumulator with a full term buffer,
+# used to turn MB into keys
+_BYTES_PER_KEY = 700
+
+# Terms an accumulator collects before they are compacted
+_TERM_BUFFER = 8
+
+class _Accumulator:
+    __slots__ = ("terms", "units")
+
+    def __init__(self, generation, units):
+        self.terms = [generation]
+        self.units = units
+
+def aggregate_generation(raw_db, clean_db, memory_limit_mb=TRANSFORM_CONFIG["memory_limit_mb"], batch_size=10000):
+    max_keys = max(int(memory_limit_mb * 1024 * 1024 / _BYTES_PER_KEY), 1)
 
-def aggregate_generation(raw_db, clean_db):
     data = {}
+    spilled = False
     for year, state_code, fuel_code, generation, units in raw_db.get_raw_generation_rows():
-        year = int(year)
+        year, _ = parse_period(year)
         generation = float(generation)
 
         key = (year, state_code, fuel_code)
 
-        if key not in data:
-            data[key] = {
-                "generation": generation,
-                "units": units
-            }
+        acc = data.get(key)
+        if acc is None:
+            if len(data) >= max_keys:
+                clean_db.spill_partial_aggregates(_partial_rows(data))
+                data.clear()
+                spilled = True
+            data[key] = _Accumulator(generation, units)
         else:
-            if units != data[key]["units"]:
+            if units != acc.units:
                 raise ValueError(
                     f'Unit mismatch for {key}: '
-                    f"{data[key]['units']} vs {units}"
+                    f"{acc.units} vs {units}"
                 )
-            data[key]["generation"] += generation
-    
-    records = [
-        {
-            "year": y,
-            "state_code": s,
-            "fuel_code": f,
-            "generation": v["generation"],
-            "units": v["units"]
-        }
-        for (y,s,f), v in data.items()
-    ]
-
-    clean_db.save_clean_data(records)
\ No newline at end of file
+            acc.terms.append(generation)
+            if len(acc.terms) > _TERM_BUFFER:
+                acc.terms = exact_terms(acc.terms)
+
+    if not spilled:
+        clean_db.save_clean_data(
+            {"year": y, "state_code": s, "fuel_code": f, "generation": math.fsum(acc.terms), "units": acc.units}
+            for (y, s, f), acc in data.items()
+        )
+        return
+
+    clean_db.spill_partial_aggregates(_partial_rows(data))
+    data.clear()
+    try:
+        clean_db.save_clean_data(_spilled_records(clean_db, batch_size))
+    finally:
+        clean_db.drop_spill()
+
+def _partial_rows(data):
+    # Spill the compacted terms rather than their rounded sum, so merging the spills stays exact
+    return (
+        (y, s, f, term, acc.units)
+        for (y, s, f), acc in data.items() for term in exact_terms(acc.terms)
+    )
+
+def _spilled_records(clean_db, batch_size):
+    for y, s, f, generation, units, other_units in clean_db.iter_spilled_aggregates(batch_size):
+        if other_units is not None:
+            raise ValueError(f'Unit mismatch for {(y, s, f)}: {units} vs {other_units}')
+        yield {"year": y, "state_code": s, "fuel_code": f, "generation": generation, "units": units}
+
+# Parallel variant: each worker process aggregates one year over its own read-only raw connection,
+# and the parent is the only writer to clean_generation.
+
+def _year_records(raw_db, year):
+    records = []
+    for state_code, fuel_code, generation, min_units, max_units in raw_db.get_year_generation_totals(year):
+        key = (year, state_code, fuel_code)
+        if min_units != max_units:
+            raise ValueError(f'Unit mismatch for {key}: {min_units} vs {max_units}')
+        records.append({
+            "year": year,
+            "state_code": state_code,
+            "fuel_code": fuel_code,
+            "generation": generation,
+            "units": min_units
+        })
+    return records
+
+def _aggregate_year(raw_path, year):
+    # One read-only connection per worker process, reused for every year it is handed
+    return _year_records(Database.shared("raw", path=raw_path, read_only=True), year)
+
+# Re-aggregates only the given years in-process; used by incremental transforms.
+
+def aggregate_generation_years(raw_db, clean_db, years):
+    for year in years:
+        clean_db.save_clean_data(_year_records(raw_db, year))
+
+def aggregate_generation_parallel(raw_db, clean_db, workers, years=None):
+    if raw_db.path == ":memory:":
+        raise ValueError("Parallel aggregation needs a file-backed raw database")
+
+    years = raw_db.get_raw_years() if years is None else years
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_aggregate_year, raw_db.path, year) for year in years]
+        for future in as_completed(futures):
+            clean_db.save_clean_data(future.result())
+
+# Plant-level clean table: raw rows are already unique per (year, plant, fuel), so each year is
+# copied across as-is into clean_plant_generation, keyed (plant_code, fuel_code, year).
+
+def build_plant_generation(raw_db, clean_db, years=None):
+    years = raw_db.get_raw_years() if years is None else years
+    for year in years:
+        clean_db.save_plant_data(year, raw_db.get_year_plant_rows(year))
+
+# Monthly datasets are aggregated per year partition in SQL, so only the requested years are read.
+# Writes { (year, month, state_code, fuel_code) } rows to clean_generation_monthly and, with
+# annual_rollup, yearly sums of the partition's raw rows (summed exactly, like every other
+# clean_generation path) to clean_generation.
+
+def aggregate_monthly_generation(raw_db, clean_db, table, years=None, annual_rollup=False):
+    # Validation only quarantines raw_generation rows, so monthly rows the mappings left out
+    # (unknown units, fuels without a description) are reported here rather than skipped
+    units, fuels = clean_db.get_mapped_codes("units"), clean_db.get_mapped_codes("fuels")
+    for year, partition in raw_db.list_partitions(table, years):
+        monthly = []
+        for period, state_code, fuel_code, generation, min_units, max_units in raw_db.get_monthly_generation_totals(partition):
+            key = (period, state_code, fuel_code)
+            if min_units != max_units:
+                raise ValueError(f'Unit mismatch for {key}: {min_units} vs {max_units}')
+            if min_units not in units:
+                raise ValueError(f'Unknown units {min_units!r} for {key} in {partition}')
+            if fuel_code not in fuels:
+                raise ValueError(f'Fuel {fuel_code!r} for {key} in {partition} has no description')
+
+            period_year, month = parse_period(period)
+            if month is None:
+                raise ValueError(f'Expected a monthly period in {partition}, got {period}')
+
+            monthly.append({
+                "year": period_year,
+                "month": month,
+                "state_code": state_code,
+                "fuel_code": fuel_code,
+                "generation": generation,
+                "units": min_units
+            })
+
+        clean_db.save_clean_monthly_data(monthly)
+
+        if annual_rollup:
+            # Units were checked per month above, and every month of a key shares them
+            clean_db.save_clean_data([
+                {"year": y, "state_code": s, "fuel_code": f, "generation": generation, "units": units}
+                for y, s, f, generation, units in raw_db.get_monthly_year_totals(partition)
+            ])
@@ -0,0 +1,183 @@
+import numpy as np
+
+from src.config import VALIDATE_CONFIG
+from src.db.repository import RAW_DIMENSIONS
+
+# Units the transform knows how to normalize (see build_units_mapping)
+KNOWN_UNITS = ("megawatthours",)
+
+# raw_metadata keys holding the highest raw id already validated by the row checks and by the
+# year-over-year check (which is bounded per run and may trail behind, see validate_raw_data)
+VALIDATION_WATERMARK = "validation_watermark"
+YOY_WATERMARK = "validation_yoy_watermark"
+
+# Raw ids the YoY check may always cover in a run, however small the table
+YOY_MIN_ROWS = 10_000
+
+# Row-level checks as (name, severity, SQL condition, dimension). A chunk is scanned once in SQLite
+# for rows failing any condition; those rows are then classified per check with NumPy (see row_checks).
+# 'error' rows are excluded from aggregation; 'warning' rows are kept but recorded.
+# Checks with a dimension only look at the state / fuel / unit value of a row, which the raw DB
+# tracks in its dimension tables at ingest, so the scan only includes them for the codes whose
+# values fail (see suspect_condition).
+ROW_CHECKS = [
+    ("null_generation", "error", "generation IS NULL", None),
+    ("unknown_units", "error",
+        f"units IS NULL OR units NOT IN ({', '.join(repr(u) for u in KNOWN_UNITS)})", "units"),
+    ("orphan_fuel", "error",
+        "fuel2002 IS NULL OR fuelTypeDescription IS NULL OR fuelTypeDescription = ''", "fuels"),
+    # Net generation is legitimately negative for e.g. pumped storage, so this is only a warning
+    ("negative_generation", "warning", "generation < 0", None),
+    ("orphan_state", "warning",
+        "state IS NULL OR stateDescription IS NULL OR stateDescription = ''", "states"),
+]
+
+
+# -----------------------------
+# Checks
+# -----------------------------
+
+def suspect_condition(raw_db):
+    """
+    SQL condition matching every raw row that may fail a row check, for get_suspect_rows.
+    Dimension checks are restricted to the codes with a failing value in the dimension tables,
+    and left out entirely when there are none, so a clean table is only scanned for the
+    generation checks.
+
+    :param raw_db: Database object for raw data
+    :return: tuple of (condition, params)
+    """
+    conditions, params = [], []
+    for _, _, condition, dimension in ROW_CHECKS:
+        if dimension is None:
+            conditions.append(f"({condition})")
+            continue
+
+        codes = raw_db.get_failing_dimension_codes(dimension, condition)
+        code_col = RAW_DIMENSIONS[dimension][0]
+        known = [code for code in codes if code is not None]
+        restrict = [f"{code_col} IN ({', '.join('?' * len(known))})"] if known else []
+        if None in codes:
+            restrict.append(f"{code_col} IS NULL")
+        if restrict:
+            conditions.append(f"(({' OR '.join(restrict)}) AND ({condition}))")
+            params += known
+    return " OR ".join(conditions), tuple(params)
+
+def _missing(values):
+    return np.equal(values, None) | np.equal(values, "")
+
+def row_checks(rows):
+    """
+    Vectorized row-level checks over the suspect rows of a chunk.
+
+    :param rows: list of (id, generation, units, fuel2002, fuelTypeDescription, state, stateDescription)
+        tuples from Database.get_suspect_rows
+    :return: list of (raw_id, check_name, severity, detail) tuples
+    """
+    if not rows:
+        return []
+
+    ids, gen, units, fuel, fuel_desc, state, state_desc = (np.array(col, dtype=object) for col in zip(*rows))
+    gen = gen.astype(float)     # None -> nan
+
+    masks = {
+        "null_generation": np.isnan(gen),
+        "unknown_units": ~np.isin(units, KNOWN_UNITS),
+        "orphan_fuel": _missing(fuel) | _missing(fuel_desc),
+        "negative_generation": gen < 0,
+        "orphan_state": _missing(state) | _missing(state_desc),
+    }
+
+    flagged = []
+    for name, severity, _, _ in ROW_CHECKS:
+        for i in np.flatnonzero(masks[name]):
+            flagged.append((int(ids[i]), name, severity, f"generation={gen[i]} units={units[i]}"))
+    return flagged
+
+def yoy_jumps(rows, max_ratio, min_generation):
+    """
+    Vectorized year-over-year jump check for plant totals.
+
+    :param rows: list of (id, generation, prev_id, prev_generation, next_id, next_generation)
+        tuples from Database.get_adjacent_year_generation
+    :param max_ratio: float, flag when the change exceeds this multiple of the smaller of the two years
+    :param min_generation: float, skip comparisons where both years are below this (in absolute value)
+    :return: list of (raw_id, check_name, severity, detail) tuples
+    """
+    if not rows:
+        return []
+
+    ids, gen, _, prev_gen, next_ids, next_gen = (
+        np.array(col, dtype=float) for col in zip(*rows)
+    )
+
+    flagged = []
+    # Compare each row to the year before it, and the year after it to this row, so rows
+    # validated earlier are still checked when an adjacent year arrives later.
+    # Measuring against the smaller year makes rises and collapses equally visible.
+    for target_ids, current, base in ((ids, gen, prev_gen), (next_ids, next_gen, gen)):
+        larger = np.fmax(np.abs(current), np.abs(base))
+        smaller = np.fmin(np.abs(current), np.abs(base))
+        with np.errstate(invalid="ignore"):
+            jump = (larger >= min_generation) & (np.abs(current - base) > max_ratio * smaller)
+        for raw_id, cur, prev in zip(target_ids[jump], current[jump], base[jump]):
+            flagged.append((int(raw_id), "yoy_jump", "warning", f"generation={cur} previous_year={prev}"))
+    return flagged
+
+
+# -----------------------------
+# Stage
+# -----------------------------
+
+def validate_raw_data(raw_db, chunk_rows=VALIDATE_CONFIG["chunk_rows"],
+                      max_ratio=VALIDATE_CONFIG["yoy_max_ratio"],
+                      min_generation=VALIDATE_CONFIG["yoy_min_generation"],
+                      yoy_max_share=VALIDATE_CONFIG["yoy_max_share"]):
+    """
+    Validate raw_generation rows ingested since the last validation and quarantine failures
+    instead of aborting. Rows are processed in id-range chunks, each committed together with the
+    validation watermark, so an interrupted run resumes where it stopped.
+
+    The row checks always cover every new row. The YoY check costs two index seeks per plant
+    total, so it keeps its own watermark and covers at most yoy_max_share of the raw table per
+    run: a typical run keeps up with the rows it ingested, while a backfill is spread over later
+    runs instead of multiplying the cost of one.
+
+    :param raw_db: Database object for raw data
+    :param chunk_rows: int, raw ids per chunk
+    :param max_ratio: float, YoY jump threshold for plant totals
+    :param min_generation: float, minimum base generation for the YoY check
+    :param yoy_max_share: float, share of the raw table's ids the YoY check covers per run
+        (at least YOY_MIN_ROWS)
+    :return: dict, rows quarantined per check name
+    """
+    counts = {name: 0 for name, _, _, _ in ROW_CHECKS}
+    counts["yoy_jump"] = 0
+
+    def quarantine(flagged):
+        by_check = {}
+        for entry in flagged:
+            by_check.setdefault(entry[1], []).append(entry)
+        for name, entries in by_check.items():
+            counts[name] += raw_db.save_quarantine(entries)    # already-quarantined rows are not recounted
+
+    lo = raw_db.get_raw_metadata(VALIDATION_WATERMARK)
+    high = raw_db.get_max_raw_id()
+    condition, params = suspect_condition(raw_db)
+    while lo < high:
+        hi = min(lo + chunk_rows, high)
+        quarantine(row_checks(raw_db.get_suspect_rows(condition, lo, hi, params)))
+        raw_db.set_raw_metadata(VALIDATION_WATERMARK, hi)   # commits the chunk
+        lo = hi
+
+    lo = raw_db.get_raw_metadata(YOY_WATERMARK)
+    stop = min(high, lo + max(int(high * yoy_max_share), YOY_MIN_ROWS))
+    while lo < stop:
+        hi = min(lo + chunk_rows, stop)
+        quarantine(yoy_jumps(raw_db.get_adjacent_year_generation(lo, hi, max_ratio, min_generation),
+                             max_ratio, min_generation))
+        raw_db.set_raw_metadata(YOY_WATERMARK, hi)
+        lo = hi
+
+    return counts
@@ -18,6 +18,9 @@ def in_memory_raw_db():
     db.cur = db.conn.cursor()
     db.table = "raw_generation"
     db.metadata_table = "crawl_metadata"
+    db.quarantine_table = "raw_quarantine"
+    db.dimension_tables = {"states": "raw_states", "fuels": "raw_fuels", "units": "raw_units"}
+    db._partitions = set()
     
     # Create minimal raw tables
     db.cur.execute(f"""
@@ -44,7 +47,25 @@ def in_memory_raw_db():
             lastTimestamp TIMESTAMP
         )
     """)
+    db.cur.execute(f"""
+        CREATE TABLE {db.quarantine_table} (
+            raw_id INTEGER,
+            check_name TEXT,
+            severity TEXT,
+            detail TEXT,
+            detectedAt TIMESTAMP,
+            UNIQUE(raw_id, check_name)
+        )
+    """)
+    db.cur.execute("""
+        CREATE TABLE raw_metadata (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        )
+    """)
+    db.cur.execute("INSERT INTO raw_metadata (key, value) VALUES ('db_id', abs(random()))")
     db.commit = db.conn.commit
+    db.initialize_dimension_tables()
     db.close = lambda: db.conn.close()
     return db
 
@@ -60,6 +81,7 @@ def in_memory_clean_db():
     db.conn.execute("PRAGMA foreign_keys = ON")
     db.cur = db.conn.cursor()
     db.table = "clean_generation"
+    db.monthly_table = "clean_generation_monthly"
     db.mapping_tables = ["states", "fuels", "units"]
 
     # Create minimal clean tables
@@ -75,6 +97,47 @@ def in_memory_clean_db():
             UNIQUE(year, state_code, fuel_code)
         )
     """)
+    db.cur.execute(f"""
+        CREATE TABLE {db.monthly_table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            year INTEGER,
+            month INTEGER,
+            state_code TEXT,
+            fuel_code TEXT,
+            generation REAL,
+            units TEXT,
+            updated_at TIMESTAMP,
+            UNIQUE(year, month, state_code, fuel_code)
+        )
+    """)
+    db.cur.execute("""
+        CREATE TABLE clean_metadata (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        )
+    """)
+    db.cur.execute("""
+        CREATE TABLE transform_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
     db.commit = db.conn.commit
     db.close = lambda: db.conn.close()
     return db
+
+@pytest.fixture
+def synthetic_raw_db():
+    """
+    Provides an in-memory raw database filled with a small synthetic dataset
+    (300 plants over 5 years, a few thousand rows).
+    """
+    from src.ingest.synthetic import SyntheticEIA
+
+    db = Database("raw", path=":memory:")
+    db.initialize_raw_tables()
+    db.synthetic = SyntheticEIA(plants=300, years=5, start_year=2020)
+    db.synthetic.write_raw(db)
+    yield db
+    db.close()
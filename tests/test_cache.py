@@ -0,0 +1,135 @@
+import sqlite3
+
+from src.analysis.cache import QueryCache
+from src.db import Database
+
+
+class CountingCleanDB:
+    def __init__(self):
+        self.db_id = 7
+        self.version = 1
+        self.calls = 0
+
+    def get_clean_identity(self):
+        return self.db_id, self.version
+
+    def pull_year_range(self):
+        self.calls += 1
+        return 2020, 2001
+
+    def aggregate_generation(self, year):
+        self.calls += 1
+        return [("COL", 150.0), ("GAS", 70.0)]
+
+    def state_generation(self, year, fuel_code="ALL"):
+        self.calls += 1
+        return [("TX", 200.0)]
+
+
+def test_repeated_queries_hit_memory():
+    db = CountingCleanDB()
+    cache = QueryCache(db)
+
+    assert cache.aggregate_generation(2020) == [("COL", 150.0), ("GAS", 70.0)]
+    assert cache.aggregate_generation(2020) == [("COL", 150.0), ("GAS", 70.0)]
+    assert db.calls == 1
+    assert cache.hits == 1
+
+
+def test_version_bump_invalidates():
+    db = CountingCleanDB()
+    cache = QueryCache(db)
+
+    cache.pull_year_range()
+    db.version += 1
+    cache.pull_year_range()
+    assert db.calls == 2
+
+
+def test_lru_eviction():
+    db = CountingCleanDB()
+    cache = QueryCache(db, max_entries=2)
+
+    cache.aggregate_generation(2018)
+    cache.aggregate_generation(2019)
+    cache.aggregate_generation(2018)    # 2018 is now most recent
+    cache.aggregate_generation(2020)    # evicts 2019
+    assert ("fuel_totals", 2019) not in cache.memory
+    assert ("fuel_totals", 2018) in cache.memory
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    db = CountingCleanDB()
+    path = str(tmp_path / "cache.sqlite")
+
+    first = QueryCache(db, disk_path=path)
+    first.state_generation(2020)
+    first.close()
+
+    second = QueryCache(db, disk_path=path)
+    assert second.state_generation(2020) == [("TX", 200.0)]
+    assert db.calls == 1
+    second.close()
+
+
+def test_disk_tier_misses_rebuilt_clean_db(tmp_path):
+    cache_path = str(tmp_path / "cache.sqlite")
+    record = {"year": 2020, "state_code": "TX", "fuel_code": "COL", "units": "megawatthours"}
+
+    def build(path, generation):
+        db = Database("clean", path=str(path))
+        db.initialize_clean_tables()
+        db.insert_states({"TX": "Texas"})
+        db.insert_fuels({"COL": "Coal"})
+        db.insert_units({"megawatthours": "MWh"})
+        db.save_clean_data([{**record, "generation": generation}])
+        return db
+
+    db = build(tmp_path / "clean.sqlite", 100)
+    cache = QueryCache(db, disk_path=cache_path)
+    assert cache.aggregate_generation(2020) == [("COL", 100.0)]
+    cache.close()
+    db.close()
+
+    # A fresh clean DB on the same cache file is back at version 1, but has a new db_id
+    db = build(tmp_path / "rebuilt.sqlite", 999)
+    assert db.get_clean_version() == 1
+    cache = QueryCache(db, disk_path=cache_path)
+    assert cache.aggregate_generation(2020) == [("COL", 999.0)]
+    cache.close()
+    db.close()
+
+
+def test_clean_version_bumped_on_save(in_memory_clean_db):
+    db = in_memory_clean_db
+    assert db.get_clean_version() == 0
+
+    db.save_clean_data([
+        {"year": 2020, "state_code": "TX", "fuel_code": "COL", "generation": 100, "units": "MWh"}
+    ])
+    assert db.get_clean_version() == 1
+
+
+def test_pre_metadata_clean_db_reads_as_version_0(tmp_path):
+    # A clean DB written before clean_metadata existed, opened read-only like visualize does
+    path = str(tmp_path / "clean.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        CREATE TABLE clean_generation (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, year INTEGER, state_code TEXT,
+            fuel_code TEXT, generation REAL, units TEXT, updated_at TIMESTAMP,
+            UNIQUE (year, state_code, fuel_code))
+        """
+    )
+    conn.execute("INSERT INTO clean_generation (year, state_code, fuel_code, generation, units) VALUES (2020, 'TX', 'COL', 100, 'MWh')")
+    conn.commit()
+    conn.close()
+
+    db = Database("clean", path=path, read_only=True)
+    cache = QueryCache(db)
+    assert db.get_clean_identity() == (0, 0)
+    assert cache.aggregate_generation(2020) == [("COL", 100.0)]
+    assert cache.aggregate_generation(2020) == [("COL", 100.0)]
+    assert cache.hits == 1
+    db.close()
@@ -1,3 +1,5 @@
+import pytest
+
 # Minimal placeholder for crawler logic
 def test_process_page_mock():
     data = [
@@ -11,3 +13,181 @@ def test_process_page_mock():
     filtered = [row for row in data if row["primeMover"] == "ALL"]
     assert len(filtered) == 1
     assert filtered[0]["plantName"] == "Plant A"
+
+def make_page(rows, total=None):
+    return {"response": {"total": str(total if total is not None else len(rows)), "data": rows}}
+
+def make_stream(page):
+    import io, json
+    from src.ingest.crawler import PageStream
+    return PageStream(io.BytesIO(json.dumps(page).encode()))
+
+def test_process_page_default_facility_fuel():
+    from src.ingest.crawler import process_page
+
+    page = make_page([
+        {"period": "2020", "plantCode": "001", "plantName": "Plant A",
+         "fuel2002": "COL", "fuelTypeDescription": "Coal", "state": "TX",
+         "stateDescription": "Texas", "primeMover": "ALL", "generation": 100,
+         "generation-units": "megawatthours"},
+        {"period": "2020", "plantCode": "001", "plantName": "Plant A",
+         "fuel2002": "COL", "fuelTypeDescription": "Coal", "state": "TX",
+         "stateDescription": "Texas", "primeMover": "ST", "generation": 60,
+         "generation-units": "megawatthours"},
+    ])
+    rows = process_page(page)
+    assert len(rows) == 1
+    assert rows[0]["units"] == "megawatthours"
+
+def test_process_page_uses_dataset_mapping():
+    from src.ingest.crawler import process_page
+
+    dataset = {
+        "fields": {"period": "period", "location": "location", "generation": "generation"},
+        "filters": {"sectorid": "99"},
+    }
+    page = make_page([
+        {"period": "2020", "location": "TX", "sectorid": "99", "generation": 5},
+        {"period": "2020", "location": "TX", "sectorid": "1", "generation": 3},
+    ])
+    assert process_page(page, dataset) == [{"period": "2020", "location": "TX", "generation": 5}]
+
+def test_crawl_dataset_uses_own_table_and_watermark(in_memory_raw_db, monkeypatch):
+    from src.ingest import crawler
+
+    db = in_memory_raw_db
+    dataset = {
+        "name": "state-fuel",
+        "pipeline": "eia_state_generation",
+        "table": "raw_state_generation",
+        "fields": {"period": "period", "location": "location", "generation": "generation"},
+        "filters": {},
+        "unique": ["period", "location"],
+    }
+    db.initialize_dataset_table(dataset["table"], list(dataset["fields"]), dataset["unique"], ["generation"])
+
+    pages = [
+        make_page([{"period": "2020", "location": "TX", "generation": 5},
+                   {"period": "2020", "location": "CA", "generation": 3}], total=3),
+        make_page([{"period": "2021", "location": "TX", "generation": 6}], total=3),
+    ]
+
+    def fake_fetch(baseurl, offset, apikey, dataset=None):
+        assert dataset["name"] == "state-fuel"
+        return True, make_stream(pages.pop(0) if pages else make_page([], total=3))
+
+    monkeypatch.setattr(crawler, "fetch_page_stream", fake_fetch)
+    monkeypatch.setattr(db, "close", lambda: None)
+
+    stored = crawler.crawl_eia_dataset("url", db, "key", dataset=dataset)
+    assert stored == 3
+    assert db.cur.execute("SELECT COUNT(*) FROM raw_state_generation").fetchone()[0] == 3
+    assert db.cur.execute(f"SELECT COUNT(*) FROM {db.table}").fetchone()[0] == 0
+    # Completed crawl resets this dataset's watermark only
+    assert db.load_metadata("eia_state_generation") == 0
+    assert db.cur.execute(
+        f"SELECT pipeline FROM {db.metadata_table}"
+    ).fetchall() == [("eia_state_generation",)]
+
+@pytest.fixture
+def small_reads(monkeypatch):
+    from src.ingest import crawler
+
+    monkeypatch.setattr(crawler, "_READ_CHUNK", 7)     # refill mid-token as often as possible
+
+def test_page_stream_yields_rows_and_total(small_reads):
+    import io, json
+    from src.ingest.crawler import PageStream
+
+    rows = [{"plantName": "Presa Río Bravo", "generation": 12345.678, "units": None} for _ in range(3)]
+    body = json.dumps({
+        "response": {"frequency": "annual", "data": rows, "description": "Facility [fuel]", "total": 3},
+        "request": {"params": {"data": ["generation"], "offset": 0}},
+        "apiVersion": "2.1.8",
+    }, ensure_ascii=False).encode()
+
+    page = PageStream(io.BytesIO(body))
+    assert list(page) == rows
+    assert page.total == 3      # found after the data as well as before it
+    assert page.rows == 3
+    assert page.stream.closed
+
+def test_page_stream_rejects_truncated_page(small_reads):
+    import io, json
+    from src.ingest.crawler import PageStream
+
+    body = json.dumps(make_page([{"period": "2020"}, {"period": "2021"}])).encode()
+    with pytest.raises(ValueError):
+        list(PageStream(io.BytesIO(body[:-12])))
+
+def test_process_page_batches():
+    from src.ingest.crawler import process_page_batches
+
+    dataset = {"fields": {"period": "period"}, "filters": {"primeMover": "ALL"}}
+    lines = [{"period": str(2000 + i), "primeMover": "ALL" if i % 2 else "ST"} for i in range(10)]
+
+    batches = list(process_page_batches(iter(lines), dataset, write_batch=2))
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert batches[0] == [{"period": "2001"}, {"period": "2003"}]
+
+def test_crawl_keeps_offset_on_broken_page(in_memory_raw_db, monkeypatch):
+    import io
+    from src.ingest import crawler
+
+    db = in_memory_raw_db
+    db.update_metadata("eia_generation", 5000)
+    monkeypatch.setattr(
+        crawler, "fetch_page_stream",
+        lambda *args, **kwargs: (True, crawler.PageStream(io.BytesIO(b'{"response": {"total": "9", "data": [{')))
+    )
+
+    with pytest.raises(RuntimeError, match="offset 5,000"):
+        crawler.crawl_eia_dataset("url", db, "key")
+    assert db.load_metadata("eia_generation") == 5000
+
+def test_crawl_all_datasets_reports_failed_crawls(monkeypatch):
+    import contextlib, threading
+    from src.ingest import crawler
+
+    caller_event = threading.Event()
+
+    def fake_crawl(baseurl, db, api_key, dataset=None, stop_event=None):
+        assert stop_event is caller_event
+        if dataset["name"] == "broken":
+            raise RuntimeError("Could not fetch page at offset 0")
+        return 7
+
+    monkeypatch.setattr(crawler, "crawl_eia_dataset", fake_crawl)
+    monkeypatch.setattr(crawler, "Database", lambda db_type: contextlib.nullcontext())
+
+    new_rows, errors = crawler.crawl_all_datasets(
+        [{"name": "ok", "url": "a"}, {"name": "broken", "url": "b"}], "key", stop_event=caller_event
+    )
+    assert new_rows == {"ok": 7}
+    assert errors == {"broken": "RuntimeError: Could not fetch page at offset 0"}
+
+def test_crawl_stops_on_event(in_memory_raw_db, monkeypatch):
+    import threading
+    from src.ingest import crawler
+
+    db = in_memory_raw_db
+    db.update_metadata("eia_generation", 5000)
+    stop_event = threading.Event()
+    stop_event.set()
+    monkeypatch.setattr(crawler, "fetch_page_stream", lambda *args, **kwargs: pytest.fail("fetched after stop"))
+
+    # A stopped crawl did not reach the end, so it fails and resumes from its offset later
+    with pytest.raises(RuntimeError, match="Crawl stopped at offset 5,000"):
+        crawler.crawl_eia_dataset("url", db, "key", stop_event=stop_event)
+    assert db.load_metadata("eia_generation") == 5000
+
+def test_annual_rollup_conflicts_with_annual_dataset():
+    from src.config import get_datasets
+
+    def dataset(name, **extra):
+        return {"name": name, "path": "p", "fields": {"period": "period"}, **extra}
+
+    monthly = dataset("monthly", table="raw_monthly", partition="year", annual_rollup=True)
+    assert [d["name"] for d in get_datasets({"base_url": "u/", "datasets": [monthly]})] == ["monthly"]
+    with pytest.raises(ValueError, match="annual_rollup"):
+        get_datasets({"base_url": "u/", "datasets": [dataset("annual"), monthly]})
@@ -59,3 +59,268 @@ def test_metadata(in_memory_raw_db):
     db.cur.execute(f"SELECT lastOffset FROM {db.metadata_table} WHERE pipeline = ?", (pipeline,))
     row = db.cur.fetchone()
     assert row[0] == offset
+
+def test_save_raw_data_ignores_duplicates(in_memory_raw_db):
+    db = in_memory_raw_db
+    record = {
+        "period": "2020", "plantCode": "001", "plantName": "Plant A", "fuel2002": "COL",
+        "fuelTypeDescription": "Coal", "state": "TX", "stateDescription": "Texas",
+        "primeMover": "ALL", "generation": 100, "units": "megawatthours"
+    }
+
+    assert db.save_raw_data([record]) == 1
+    assert db.save_raw_data([record, dict(record, period="2021")]) == 1
+    assert len(db.load_raw_data()) == 2
+
+def test_parse_period():
+    from src.db.repository import parse_period
+
+    assert parse_period("2020") == (2020, None)
+    assert parse_period("2020-03") == (2020, 3)
+    assert parse_period(2019) == (2019, None)
+    with pytest.raises(ValueError):
+        parse_period("03/2020")
+
+def test_partitioned_raw_data(in_memory_raw_db):
+    from src.db.repository import RAW_COLUMNS
+
+    db = in_memory_raw_db
+    base = {
+        "plantCode": "001", "plantName": "Plant A", "fuel2002": "COL",
+        "fuelTypeDescription": "Coal", "state": "TX", "stateDescription": "Texas",
+        "primeMover": "ALL", "generation": 10, "units": "megawatthours"
+    }
+    records = [dict(base, period=p) for p in ("2019-12", "2020-01", "2020-02")]
+
+    inserted = db.save_partitioned_raw_data(
+        records, "raw_monthly", RAW_COLUMNS, ["period", "plantCode", "fuel2002"], ["generation"]
+    )
+    assert inserted == 3
+    assert db.list_partitions("raw_monthly") == [(2019, "raw_monthly_2019"), (2020, "raw_monthly_2020")]
+    assert db.list_partitions("raw_monthly", years=[2020]) == [(2020, "raw_monthly_2020")]
+    assert db.cur.execute("SELECT COUNT(*) FROM raw_monthly_2020").fetchone()[0] == 2
+
+@pytest.fixture
+def plant_clean_db():
+    from src.db import Database
+
+    db = Database("clean", path=":memory:")
+    db.initialize_clean_tables()
+    db.insert_states({"TX": "Texas", "CA": "California"})
+    db.insert_fuels({"ALL": "Total", "COL": "Coal", "NG": "Natural Gas"})
+    db.insert_units({"megawatthours": "MWh"})
+    for year in (2020, 2021):
+        db.save_plant_data(year, [
+            ("001", "Alpha", "TX", "ALL", 100 * (year - 2019), "megawatthours"),
+            ("001", "Alpha", "TX", "COL", 60 * (year - 2019), "megawatthours"),
+            ("002", "Beta", "TX", "ALL", 150, "megawatthours"),
+            ("003", "Gamma", "TX", "ALL", 50, "megawatthours"),
+            ("004", "Delta", "CA", "ALL", 500, "megawatthours"),
+        ])
+    yield db
+    db.close()
+
+def test_plant_series(plant_clean_db):
+    db = plant_clean_db
+    assert db.get_plant_series("001") == [(2020, 100), (2021, 200)]
+    assert db.get_plant_series("001", "COL") == [(2020, 60), (2021, 120)]
+
+def test_top_plants(plant_clean_db):
+    db = plant_clean_db
+    assert db.top_plants("TX", 2020, n=2) == [("002", "Beta", 150), ("001", "Alpha", 100)]
+    assert db.top_plants("TX", 2021, n=1) == [("001", "Alpha", 200)]
+
+def test_plant_queries_use_indexes(plant_clean_db):
+    db = plant_clean_db
+    plans = [
+        db.cur.execute(
+            f"EXPLAIN QUERY PLAN SELECT year, generation FROM {db.plant_table} "
+            "WHERE plant_code = ? AND fuel_code = ? ORDER BY year", ("001", "ALL")
+        ).fetchall(),
+        db.cur.execute(
+            f"EXPLAIN QUERY PLAN SELECT plant_code FROM {db.plant_table} "
+            "WHERE state_code = ? AND year = ? AND fuel_code = ? ORDER BY generation DESC LIMIT 10",
+            ("TX", 2020, "ALL")
+        ).fetchall(),
+    ]
+    for plan in plans:
+        details = " ".join(row[-1] for row in plan)
+        assert "SEARCH" in details
+        assert "TEMP B-TREE" not in details
+
+def test_clean_changes_logged_per_run():
+    from src.db import Database
+
+    db = Database("clean", path=":memory:")
+    db.initialize_clean_tables()
+    db.insert_states({"TX": "Texas"})
+    db.insert_fuels({"COL": "Coal", "NG": "Natural Gas"})
+    db.insert_units({"megawatthours": "MWh"})
+
+    def record(fuel, generation):
+        return {"year": 2020, "state_code": "TX", "fuel_code": fuel, "generation": generation, "units": "megawatthours"}
+
+    first = db.begin_run()
+    db.save_clean_data([record("COL", 100), record("NG", 50)])
+
+    # A consumer streaming mid-run resumes from the last change it saw, not the run id
+    changes = list(db.iter_changes())
+    assert changes == [
+        (1, first, 2020, "TX", "COL", None, 100),
+        (2, first, 2020, "TX", "NG", None, 50),
+    ]
+    db.save_clean_data([record("COL", 110)])
+    db.finish_run(first)
+
+    second = db.begin_run()
+    db.save_clean_data([record("COL", 120), record("NG", 50)])     # NG unchanged, not logged
+    db.finish_run(second)
+
+    assert list(db.iter_changes(since_change_id=changes[-1][0], batch_size=1)) == [
+        (3, first, 2020, "TX", "COL", 100, 110),
+        (4, second, 2020, "TX", "COL", 110, 120),
+    ]
+    assert db.get_latest_run_id() == second
+
+    # Writes outside a run are logged under a run of their own
+    db.save_clean_data([record("NG", 60)])
+    own = db.get_latest_run_id()
+    assert own > second
+    assert list(db.iter_changes(since_change_id=4)) == [(5, own, 2020, "TX", "NG", 50, 60)]
+    assert db.cur.execute("SELECT COUNT(*) FROM transform_runs WHERE finished_at IS NULL").fetchone()[0] == 0
+    db.close()
+
+def test_clean_changes_rolled_back_with_upsert():
+    from src.db import Database
+
+    db = Database("clean", path=":memory:")
+    db.initialize_clean_tables()
+    db.conn.execute("PRAGMA foreign_keys = OFF")
+    db.begin_run()
+
+    def records():
+        yield {"year": 2020, "state_code": "TX", "fuel_code": "COL", "generation": 1, "units": "megawatthours"}
+        raise ValueError("bad record")
+
+    with pytest.raises(ValueError):
+        db.save_clean_data(records())
+    assert list(db.iter_changes()) == []
+    db.close()
+
+# -------------------------------
+# Connection lifecycle tests
+# -------------------------------
+
+def test_shared_handles_reused_per_path_and_mode(tmp_path):
+    from src.db import Database
+
+    path = str(tmp_path / "raw.sqlite")
+    db = Database.shared("raw", path=path)
+    db.initialize_raw_tables()
+    assert Database.shared("raw", path=path) is db
+
+    reader = Database.shared("raw", path=path, read_only=True)
+    assert reader is not db
+    with pytest.raises(Exception):
+        reader.conn.execute("CREATE TABLE t (x)")
+
+    db.close()      # no-op for shared handles
+    assert db.get_max_raw_id() == 0
+
+    Database.close_all()
+    assert Database.shared("raw", path=path) is not db
+    Database.close_all()
+
+def test_close_all_skips_other_threads_handles(tmp_path):
+    import threading
+    from src.db import Database
+
+    path = str(tmp_path / "raw.sqlite")
+    handles = []
+    worker = threading.Thread(target=lambda: handles.append(Database.shared("raw", path=path)))
+    worker.start()
+    worker.join()
+    own = Database.shared("raw", path=path)
+
+    Database.close_all()        # must not stop at the other thread's handle
+    assert Database._registry == {}
+    with pytest.raises(Exception):
+        own.conn.execute("SELECT 1")
+    assert Database.shared("raw", path=path) is not own
+    Database.close_all()
+
+def test_schema_ddl_runs_once_per_process(tmp_path):
+    from src.db import Database
+
+    path = str(tmp_path / "clean.sqlite")
+    with Database("clean", path=path) as db:
+        db.initialize_clean_tables()
+
+    statements = []
+    with Database("clean", path=path) as db:
+        db.conn.set_trace_callback(statements.append)
+        db.initialize_clean_tables()
+        assert statements == []
+
+        db.initialize_clean_tables(reset=True)      # a reset always runs
+        assert statements
+
+def test_context_manager_commits_or_rolls_back(tmp_path):
+    from src.db import Database
+
+    path = str(tmp_path / "raw.sqlite")
+    with Database("raw", path=path) as db:
+        db.initialize_raw_tables()
+        db.update_metadata("eia_generation", 10)
+
+    with pytest.raises(RuntimeError):
+        with Database("raw", path=path) as db:
+            db.cur.execute(f"UPDATE {db.metadata_table} SET lastOffset = 20")
+            raise RuntimeError("abort")
+
+    with Database("raw", path=path, read_only=True) as db:
+        assert db.load_metadata("eia_generation") == 10
+
+# -------------------------------
+# Dimension table tests
+# -------------------------------
+
+def dimension(db, name):
+    return db.cur.execute(f"SELECT code, description FROM {db.dimension_tables[name]} ORDER BY id").fetchall()
+
+def test_save_raw_data_tracks_dimensions(in_memory_raw_db):
+    db = in_memory_raw_db
+    base = {"plantName": "Plant", "primeMover": "ALL", "generation": 1.0, "units": "megawatthours"}
+    db.save_raw_data([
+        dict(base, period="2020", plantCode="1", fuel2002="COL", fuelTypeDescription="coal", state="TX", stateDescription="Texas"),
+        dict(base, period="2020", plantCode="2", fuel2002="NG", fuelTypeDescription="natural gas", state="TX", stateDescription="Texas"),
+    ])
+    db.save_raw_data([
+        dict(base, period="2021", plantCode="1", fuel2002="COL", fuelTypeDescription="coal", state="CA", stateDescription=None),
+    ])
+
+    assert dimension(db, "states") == [("TX", "Texas"), ("CA", None)]
+    assert dimension(db, "fuels") == [("COL", "coal"), ("NG", "natural gas")]
+    assert dimension(db, "units") == [("megawatthours", None)]
+
+    # Other datasets' columns don't carry the dimensions and leave them alone
+    db.initialize_dataset_table("raw_state_generation", ["period", "location"], ["period", "location"])
+    db.save_raw_data([{"period": "2020", "location": "TX"}], "raw_state_generation", ["period", "location"])
+    assert len(dimension(db, "states")) == 2
+
+def test_backfill_dimensions_from_existing_rows(in_memory_raw_db):
+    db = in_memory_raw_db
+    db.cur.execute(f"""INSERT INTO {db.table} (period, plantCode, fuel2002, fuelTypeDescription, state, stateDescription, units)
+        VALUES ('2020', '1', 'COL', 'coal', 'TX', 'Texas', 'megawatthours'),
+               ('2021', '1', 'COL', 'coal', 'TX', 'Texas', 'megawatthours')""")
+    db.initialize_dataset_table("raw_generation_monthly_2020", ["period", "state", "stateDescription"], ["period", "state"])
+    db.cur.execute("INSERT INTO raw_generation_monthly_2020 (period, state, stateDescription) VALUES ('2020-01', 'WA', 'Washington')")
+
+    db.backfill_dimensions()
+    assert sorted(dimension(db, "states")) == [("TX", "Texas"), ("WA", "Washington")]
+    assert dimension(db, "units") == [("megawatthours", None)]
+
+    # Only empty dimension tables are backfilled
+    db.cur.execute(f"INSERT INTO {db.table} (period, plantCode, fuel2002, state) VALUES ('2022', '2', 'NG', 'OR')")
+    db.backfill_dimensions()
+    assert len(dimension(db, "states")) == 2
@@ -0,0 +1,138 @@
+import pytest
+
+from src.scheduler import PipelineDaemon, PipelineLock, load_stats
+
+
+def make_daemon(tmp_path, poll, ingest, transform, pending=lambda: False):
+    return PipelineDaemon(
+        poll=poll,
+        ingest=ingest,
+        pending=pending,
+        transform=transform,
+        interval_seconds=0,
+        lock_path=str(tmp_path / "pipeline.lock"),
+        stats_path=str(tmp_path / "stats.json"),
+    )
+
+
+def test_transform_runs_only_when_new_rows(tmp_path):
+    transforms = []
+    stored = {"raw": 0, "clean": 0}     # highest raw id stored / transformed
+    new_rows = iter([{"facility-fuel": 12}, {"facility-fuel": 0}])
+
+    def ingest(changed, stop_event):
+        rows = next(new_rows)
+        stored["raw"] += rows["facility-fuel"]
+        return rows, {}
+
+    def transform():
+        transforms.append(1)
+        stored["clean"] = stored["raw"]
+
+    daemon = make_daemon(
+        tmp_path,
+        poll=lambda: [{"name": "facility-fuel"}],
+        ingest=ingest,
+        pending=lambda: stored["raw"] > stored["clean"],
+        transform=transform,
+    )
+
+    assert daemon.run_once()["transformed"] is True
+    assert daemon.run_once()["transformed"] is False
+    assert len(transforms) == 1
+
+    stats = load_stats(str(tmp_path / "stats.json"))
+    assert stats["runs"] == 2
+    assert stats["transforms"] == 1
+    assert stats["last_run"]["new_rows"] == {"facility-fuel": 0}
+
+
+def test_no_ingest_without_upstream_changes(tmp_path):
+    def ingest(changed, stop_event):
+        raise AssertionError("ingest should not run")
+
+    daemon = make_daemon(tmp_path, poll=lambda: [], ingest=ingest, transform=lambda: None)
+    run = daemon.run_once()
+    assert run["error"] is None
+    assert run["changed_datasets"] == []
+
+
+def test_errors_are_recorded(tmp_path):
+    def poll():
+        raise ConnectionError("API down")
+
+    daemon = make_daemon(tmp_path, poll=poll, ingest=lambda c, e: ({}, {}), transform=lambda: None)
+    run = daemon.run_once()
+    assert run["error"] == "ConnectionError: API down"
+    assert load_stats(str(tmp_path / "stats.json"))["errors"] == 1
+
+
+def test_failed_transform_is_retried_and_crawl_errors_recorded(tmp_path):
+    stored = {"raw": 0, "clean": 0}
+    failures = iter([True, False])
+    new_rows = iter([({"facility-fuel": 5}, {"state-fuel": "RuntimeError: Could not fetch page at offset 0"})])
+
+    def ingest(changed, stop_event):
+        rows, errors = next(new_rows)
+        stored["raw"] += rows["facility-fuel"]
+        return rows, errors
+
+    def transform():
+        if next(failures):
+            raise RuntimeError("disk full")
+        stored["clean"] = stored["raw"]
+
+    polls = iter([[{"name": "facility-fuel"}, {"name": "state-fuel"}], []])
+    daemon = make_daemon(
+        tmp_path,
+        poll=lambda: next(polls),
+        ingest=ingest,
+        pending=lambda: stored["raw"] > stored["clean"],
+        transform=transform,
+    )
+
+    run = daemon.run_once()
+    assert run["transformed"] is False
+    assert run["error"] == (
+        "[state-fuel] RuntimeError: Could not fetch page at offset 0; RuntimeError: disk full"
+    )
+    # No new rows upstream, but the rows stored by the failed run are still transformed
+    run = daemon.run_once()
+    assert run["new_rows"] == {}
+    assert run["transformed"] is True
+    assert run["error"] is None
+
+    stats = load_stats(str(tmp_path / "stats.json"))
+    assert stats["errors"] == 1
+    assert stats["transforms"] == 1
+
+
+def test_lock_prevents_concurrent_runs(tmp_path):
+    path = str(tmp_path / "pipeline.lock")
+    with PipelineLock(path):
+        with pytest.raises(RuntimeError):
+            with PipelineLock(path):
+                pass
+    # Released after the first run finishes
+    with PipelineLock(path):
+        pass
+
+
+def test_stop_request_reaches_ingest_and_skips_transform(tmp_path):
+    def ingest(changed, stop_event):
+        stop_event.set()    # as SIGTERM would, mid-crawl
+        return {}, {"facility-fuel": "RuntimeError: Crawl stopped at offset 0"}
+
+    def transform():
+        raise AssertionError("transform should not run after a stop request")
+
+    daemon = make_daemon(
+        tmp_path,
+        poll=lambda: [{"name": "facility-fuel"}],
+        ingest=ingest,
+        pending=lambda: True,
+        transform=transform,
+    )
+    run = daemon.run_once()
+    assert run["transformed"] is False
+    assert run["error"] == "[facility-fuel] RuntimeError: Crawl stopped at offset 0"
@@ -0,0 +1,136 @@
+import http.client
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from src.db import Database
+from src.service.server import create_server
+
+
+@pytest.fixture
+def service(tmp_path):
+    path = str(tmp_path / "clean.sqlite")
+    db = Database("clean", path=path)
+    db.initialize_clean_tables()
+    db.insert_states({"TX": "Texas", "CA": "California"})
+    db.insert_fuels({"ALL": "Total", "COL": "Coal", "NG": "Natural Gas"})
+    db.insert_units({"megawatthours": "MWh"})
+    db.save_clean_data([
+        {"year": y, "state_code": s, "fuel_code": f, "generation": g, "units": "megawatthours"}
+        for y, s, f, g in [
+            (2020, "TX", "COL", 50), (2020, "TX", "NG", 70), (2020, "TX", "ALL", 120),
+            (2020, "CA", "NG", 30), (2020, "CA", "ALL", 30), (2021, "TX", "ALL", 10),
+        ]
+    ])
+
+    server = create_server(path=path, port=0, pool_size=2, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, db
+
+    server.shutdown()
+    server.server_close()
+    server.queries.pool.close()
+    db.close()
+
+
+def get(server, path, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response, json.loads(body) if body else None
+
+
+def test_endpoints(service):
+    server, _ = service
+
+    _, years = get(server, "/years")
+    assert years == {"min": 2020, "max": 2021}
+
+    _, fuels = get(server, "/fuels/top?year=2020&n=1")
+    assert fuels == [{"fuel_code": "NG", "generation": 100}]
+
+    _, states = get(server, "/states?year=2020")
+    assert [s["state_code"] for s in states] == ["TX", "CA"]
+
+
+def test_bad_requests(service):
+    server, _ = service
+    assert get(server, "/fuels/top")[0].status == 400
+    assert get(server, "/states?year=abc")[0].status == 400
+    assert get(server, "/fuels/top?year=2020&n=0")[0].status == 400
+    assert get(server, "/fuels/top?year=2020&n=-1")[0].status == 400
+    assert get(server, "/nope")[0].status == 404
+
+
+def test_etag_tracks_clean_version(service):
+    server, db = service
+
+    response, _ = get(server, "/years")
+    etag = response.getheader("ETag")
+    assert get(server, "/years", {"If-None-Match": etag})[0].status == 304
+
+    db.save_clean_data([
+        {"year": 2022, "state_code": "TX", "fuel_code": "ALL", "generation": 5, "units": "megawatthours"}
+    ])
+    response, years = get(server, "/years", {"If-None-Match": etag})
+    assert response.status == 200
+    assert years["max"] == 2022
+
+
+def test_etag_differs_for_rebuilt_clean_db(service, tmp_path):
+    server, db = service
+    etag = get(server, "/years")[0].getheader("ETag")
+
+    # A clean DB built from scratch is back at the same version, but gets a different tag
+    other_path = str(tmp_path / "other.sqlite")
+    other = Database("clean", path=other_path)
+    other.initialize_clean_tables()
+    other.insert_states({"TX": "Texas"})
+    other.insert_fuels({"ALL": "Total"})
+    other.insert_units({"megawatthours": "MWh"})
+    other.save_clean_data([
+        {"year": 2020, "state_code": "TX", "fuel_code": "ALL", "generation": 1, "units": "megawatthours"}
+    ])
+    assert other.get_clean_version() == db.get_clean_version()
+    other.close()
+    other_server = create_server(path=other_path, port=0, pool_size=1, quiet=True)
+    threading.Thread(target=other_server.serve_forever, daemon=True).start()
+    try:
+        assert get(other_server, "/years", {"If-None-Match": etag})[0].status == 200
+    finally:
+        other_server.shutdown()
+        other_server.server_close()
+        other_server.queries.pool.close()
+
+
+def test_pre_metadata_db_and_database_errors(tmp_path):
+    # A clean DB written before clean_metadata existed serves as version 0
+    path = str(tmp_path / "clean.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE clean_generation (year INTEGER, state_code TEXT, fuel_code TEXT, generation REAL)")
+    conn.execute("INSERT INTO clean_generation VALUES (2020, 'TX', 'ALL', 10)")
+    conn.commit()
+
+    server = create_server(path=path, port=0, pool_size=1, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        response, years = get(server, "/years")
+        assert response.status == 200
+        assert response.getheader("ETag") == '"0-v0"'
+        assert years == {"min": 2020, "max": 2020}
+
+        # Other database errors come back as a JSON 500 instead of a dropped connection
+        conn.execute("DROP TABLE clean_generation")
+        conn.commit()
+        response, body = get(server, "/years")
+        assert response.status == 500
+        assert "no such table" in body["error"]
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.queries.pool.close()
+        conn.close()
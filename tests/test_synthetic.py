@@ -0,0 +1,78 @@
+import pytest
+
+from src.ingest.synthetic import SyntheticEIA
+
+
+def test_synthetic_rows_are_deterministic():
+    first = SyntheticEIA(plants=50, years=3, seed=7)
+    second = SyntheticEIA(plants=50, years=3, seed=7)
+    other = SyntheticEIA(plants=50, years=3, seed=8)
+
+    rows = list(first.iter_rows())
+    assert rows == list(second.iter_rows())
+    assert rows != list(other.iter_rows())
+    assert len(rows) == first.total == first.capacity
+
+    # Any slice can be rebuilt on its own, across year boundaries
+    lo, hi = first.rows_per_year - 5, first.rows_per_year + 5
+    assert list(second.iter_rows(lo, hi)) == rows[lo:hi]
+
+def test_synthetic_cardinalities_and_totals():
+    gen = SyntheticEIA(plants=2000, years=2)
+    rows = list(gen.iter_rows())
+
+    assert len({r["plantCode"] for r in rows}) == 2000
+    assert len({r["state"] for r in rows}) == 55
+    assert len({r["fuel2002"] for r in rows}) == 31     # 30 fuels + ALL
+    assert {r["period"] for r in rows} == {"2000", "2001"}
+
+    # Each plant-year's ALL row is the sum of its fuel rows
+    sums, totals = {}, {}
+    for r in rows:
+        key = (r["period"], r["plantCode"])
+        if r["fuel2002"] == "ALL":
+            totals[key] = r["generation"]
+        else:
+            sums[key] = sums.get(key, 0) + r["generation"]
+    assert sums.keys() == totals.keys()
+    assert all(sums[k] == pytest.approx(totals[k], abs=0.01) for k in totals)
+
+def test_synthetic_rows_add_plants_to_reach_row_count():
+    gen = SyntheticEIA(rows=100_000, plants=100, years=25)
+    assert gen.plants > 100
+    assert gen.capacity >= 100_000
+    assert gen.total == 100_000
+    assert sum(1 for _ in gen.iter_rows(99_990)) == 10
+
+def test_crawl_synthetic_pages(in_memory_raw_db, monkeypatch):
+    import src.ingest.crawler as crawler
+
+    gen = SyntheticEIA(plants=40, years=3)
+    monkeypatch.setattr(crawler, "fetch_page_stream", lambda *args, **kwargs: gen.fetch_page_stream(*args, length=100))
+
+    stored = crawler.crawl_eia_dataset("url", in_memory_raw_db, "key")
+
+    assert stored == gen.total
+    assert in_memory_raw_db.get_max_raw_id() == gen.total
+
+def test_transform_synthetic_raw_db(synthetic_raw_db):
+    from src.db import Database
+    from src.transform.clean import (
+        build_state_mapping, build_units_mapping, build_fuels_mapping, aggregate_generation
+    )
+
+    raw = synthetic_raw_db
+    clean = Database("clean", path=":memory:")
+    clean.initialize_clean_tables()
+    build_state_mapping(raw, clean)
+    build_units_mapping(raw, clean)
+    build_fuels_mapping(raw, clean)
+    aggregate_generation(raw, clean)
+
+    expected = {}
+    for r in raw.synthetic.iter_rows():
+        if r["fuel2002"] == "ALL":
+            expected[int(r["period"])] = expected.get(int(r["period"]), 0) + r["generation"]
+    clean.cur.execute(f"SELECT year, SUM(generation) FROM {clean.table} WHERE fuel_code = 'ALL' GROUP BY year")
+    assert {year: pytest.approx(total) for year, total in clean.cur.fetchall()} == expected
+    clean.close()
@@ -25,3 +25,247 @@ def test_clean_db_save_and_load(in_memory_clean_db):
     assert len(loaded) == 2
     assert ("TX", "COL", 100) in loaded
     assert ("CA", "GAS", 50) in loaded
+
+def test_aggregate_monthly_generation(in_memory_raw_db):
+    from src.db import Database
+    from src.db.repository import RAW_COLUMNS
+    from src.transform.clean import aggregate_monthly_generation, build_units_mapping, build_fuels_mapping
+
+    raw = in_memory_raw_db
+    base = {
+        "plantName": "Plant", "fuel2002": "COL", "fuelTypeDescription": "Coal",
+        "state": "TX", "stateDescription": "Texas", "primeMover": "ALL", "units": "megawatthours"
+    }
+    records = [
+        dict(base, period="2020-01", plantCode="001", generation=10),
+        dict(base, period="2020-01", plantCode="002", generation=5),
+        dict(base, period="2020-02", plantCode="001", generation=7),
+        dict(base, period="2021-01", plantCode="001", generation=1),
+    ]
+    raw.save_partitioned_raw_data(records, "raw_monthly", RAW_COLUMNS, ["period", "plantCode", "fuel2002"])
+
+    clean = Database("clean", path=":memory:")
+    clean.initialize_clean_tables()
+    clean.insert_states({"TX": "Texas"})
+    build_units_mapping(raw, clean)
+    build_fuels_mapping(raw, clean)
+    aggregate_monthly_generation(raw, clean, "raw_monthly", years=[2020], annual_rollup=True)
+
+    clean.cur.execute(f"SELECT year, month, generation FROM {clean.monthly_table} ORDER BY month")
+    assert clean.cur.fetchall() == [(2020, 1, 15), (2020, 2, 7)]
+    clean.cur.execute(f"SELECT year, state_code, fuel_code, generation FROM {clean.table}")
+    assert clean.cur.fetchall() == [(2020, "TX", "COL", 22)]
+
+    # Monthly partitions are not validated, so rows the mappings leave out fail with a clear error
+    raw.save_partitioned_raw_data(
+        [dict(base, period="2021-02", plantCode="001", generation=3, units="kilowatthours")],
+        "raw_monthly", RAW_COLUMNS, ["period", "plantCode", "fuel2002"]
+    )
+    build_units_mapping(raw, clean)
+    with pytest.raises(ValueError, match="Unknown units 'kilowatthours'"):
+        aggregate_monthly_generation(raw, clean, "raw_monthly", years=[2021])
+    clean.close()
+
+def test_monthly_annual_rollup_is_exact(in_memory_raw_db):
+    from src.db import Database
+    from src.db.repository import RAW_COLUMNS
+    from src.transform.clean import aggregate_monthly_generation, build_units_mapping, build_fuels_mapping
+
+    raw = in_memory_raw_db
+    base = {
+        "plantName": "Plant", "fuel2002": "COL", "fuelTypeDescription": "Coal",
+        "state": "TX", "stateDescription": "Texas", "primeMover": "ALL", "units": "megawatthours"
+    }
+    # January rounds 1e16 + 1 down to 1e16; adding the monthly sums would lose both ones
+    raw.save_partitioned_raw_data([
+        dict(base, period="2020-01", plantCode="001", generation=1e16),
+        dict(base, period="2020-01", plantCode="002", generation=1.0),
+        dict(base, period="2020-02", plantCode="002", generation=1.0),
+    ], "raw_monthly", RAW_COLUMNS, ["period", "plantCode", "fuel2002"], ["generation"])
+
+    clean = Database("clean", path=":memory:")
+    clean.initialize_clean_tables()
+    clean.insert_states({"TX": "Texas"})
+    build_units_mapping(raw, clean)
+    build_fuels_mapping(raw, clean)
+    aggregate_monthly_generation(raw, clean, "raw_monthly", annual_rollup=True)
+
+    clean.cur.execute(f"SELECT generation FROM {clean.table}")
+    assert clean.cur.fetchall() == [(1e16 + 2,)]
+    clean.close()
+
+def test_parallel_aggregation_matches_serial(tmp_path):
+    from src.db import Database
+    from src.ingest.synthetic import SyntheticEIA
+    from src.transform.clean import (
+        aggregate_generation, aggregate_generation_parallel, aggregate_generation_years
+    )
+
+    # Float generation, so the sums depend on rounding unless every path adds up exactly
+    raw = Database("raw", path=str(tmp_path / "raw.sqlite"))
+    raw.initialize_raw_tables()
+    SyntheticEIA(plants=300, years=5, start_year=2020).write_raw(raw)
+
+    def clean_db():
+        db = Database("clean", path=":memory:")
+        db.initialize_clean_tables()
+        db.conn.execute("PRAGMA foreign_keys = OFF")
+        return db
+
+    serial, spilled, parallel, by_year = clean_db(), clean_db(), clean_db(), clean_db()
+    aggregate_generation(raw, serial)
+    aggregate_generation(raw, spilled, memory_limit_mb=0.01)
+    aggregate_generation_parallel(raw, parallel, workers=3)
+    aggregate_generation_years(raw, by_year, raw.get_raw_years())
+    raw.close()
+
+    query = "SELECT year, state_code, fuel_code, generation, units FROM clean_generation ORDER BY 1, 2, 3"
+    expected = serial.cur.execute(query).fetchall()
+    assert len(expected) > 100
+    for db in (spilled, parallel, by_year):
+        assert db.cur.execute(query).fetchall() == expected
+
+def test_aggregate_generation_years_recomputes_only_given_years(in_memory_raw_db, in_memory_clean_db):
+    from src.transform.clean import aggregate_generation_years
+
+    raw = in_memory_raw_db
+    base = {
+        "plantName": "Plant", "fuel2002": "COL", "fuelTypeDescription": "Coal",
+        "state": "TX", "stateDescription": "Texas", "primeMover": "ALL", "units": "megawatthours"
+    }
+    raw.save_raw_data([dict(base, period="2020", plantCode="001", generation=10)])
+    watermark = raw.get_max_raw_id()
+    raw.save_raw_data([
+        dict(base, period="2021", plantCode="001", generation=4),
+        dict(base, period="2021", plantCode="002", generation=6),
+    ])
+
+    years = raw.get_raw_years(since_id=watermark)
+    assert years == [2021]
+
+    clean = in_memory_clean_db
+    aggregate_generation_years(raw, clean, years)
+    clean.cur.execute(f"SELECT year, generation FROM {clean.table}")
+    assert clean.cur.fetchall() == [(2021, 10)]
+
+def _raw_rows(raw, rows):
+    base = {
+        "plantName": "Plant", "fuelTypeDescription": "", "stateDescription": "", "primeMover": "ALL"
+    }
+    raw.save_raw_data([
+        dict(base, period=p, plantCode=c, fuel2002=f, state=s, generation=g, units=u)
+        for p, c, f, s, g, u in rows
+    ])
+
+def test_aggregate_generation_spills_to_disk(in_memory_raw_db, in_memory_clean_db):
+    from src.transform.clean import aggregate_generation
+
+    rows = [
+        (str(year), str(plant), fuel, state, plant + year % 7, "megawatthours")
+        for year in (2019, 2020) for plant in range(20) for fuel in ("COL", "NG")
+        for state in (("TX",) if plant % 2 else ("CA",))
+    ]
+    _raw_rows(in_memory_raw_db, rows)
+
+    clean = in_memory_clean_db
+    # A zero budget keeps one key in memory, so nearly every row goes through the spill table
+    aggregate_generation(in_memory_raw_db, clean, memory_limit_mb=0, batch_size=3)
+    spilled = clean.cur.execute(
+        f"SELECT year, state_code, fuel_code, generation FROM {clean.table} ORDER BY 1, 2, 3"
+    ).fetchall()
+
+    clean.cur.execute(f"DELETE FROM {clean.table}")
+    aggregate_generation(in_memory_raw_db, clean)
+    in_memory = clean.cur.execute(
+        f"SELECT year, state_code, fuel_code, generation FROM {clean.table} ORDER BY 1, 2, 3"
+    ).fetchall()
+
+    assert len(spilled) == 8
+    assert spilled == in_memory
+
+def test_unit_mismatch_detected_across_spills(in_memory_raw_db, in_memory_clean_db):
+    from src.transform.clean import aggregate_generation
+
+    _raw_rows(in_memory_raw_db, [
+        ("2020", "001", "COL", "TX", 1, "megawatthours"),
+        ("2020", "002", "NG", "TX", 1, "megawatthours"),
+        ("2020", "003", "COL", "TX", 1, "gigawatthours"),
+    ])
+
+    with pytest.raises(ValueError, match="Unit mismatch"):
+        aggregate_generation(in_memory_raw_db, in_memory_clean_db, memory_limit_mb=0)
+    assert in_memory_clean_db.load_clean_data() == []
+
+def test_build_plant_generation(in_memory_raw_db):
+    from src.db import Database
+    from src.transform.clean import build_plant_generation
+
+    _raw_rows(in_memory_raw_db, [
+        ("2020", "001", "ALL", "TX", 10, "megawatthours"),
+        ("2020", "001", "COL", "TX", 10, "megawatthours"),
+        ("2021", "001", "ALL", "TX", 12, "megawatthours"),
+    ])
+    clean = Database("clean", path=":memory:")
+    clean.initialize_clean_tables()
+    clean.conn.execute("PRAGMA foreign_keys = OFF")
+
+    build_plant_generation(in_memory_raw_db, clean)
+    assert clean.get_plant_series("001") == [(2020, 10), (2021, 12)]
+    assert clean.top_plants("TX", 2020) == [("001", "Plant", 10)]
+    clean.close()
+
+def test_mappings_sync_only_new_dimension_values(in_memory_raw_db):
+    from src.db import Database
+    from src.transform.clean import build_state_mapping, build_units_mapping, build_fuels_mapping
+
+    raw = in_memory_raw_db
+    clean = Database("clean", path=":memory:")
+    clean.initialize_clean_tables()
+    base = {"plantName": "Plant", "primeMover": "ALL", "generation": 1.0}
+
+    def sync():
+        build_state_mapping(raw, clean)
+        build_units_mapping(raw, clean)
+        build_fuels_mapping(raw, clean)
+
+    raw.save_raw_data([
+        dict(base, period="2020", plantCode="1", fuel2002="COL", fuelTypeDescription="coal and lignite",
+             state="PR", stateDescription="", units="megawatthours"),
+        # Quarantined by validation: unknown units, orphan fuel
+        dict(base, period="2020", plantCode="2", fuel2002="NG", fuelTypeDescription="",
+             state="TX", stateDescription="Texas", units="kilowatthours"),
+    ])
+    sync()
+    assert clean.cur.execute("SELECT * FROM states ORDER BY state_code").fetchall() == [("PR", "Puerto Rico"), ("TX", "Texas")]
+    assert clean.cur.execute("SELECT * FROM fuels").fetchall() == [("COL", "Coal & Lignite")]
+    assert clean.cur.execute("SELECT * FROM units").fetchall() == [("megawatthours", "MWh")]
+
+    # The next sync reads only dimension values added since
+    raw.save_raw_data([
+        dict(base, period="2021", plantCode="1", fuel2002="SUN", fuelTypeDescription="solar",
+             state="PR", stateDescription="", units="megawatthours"),
+    ])
+    assert raw.get_dimension_values("fuels", clean.get_clean_metadata("dimension_watermark:raw_fuels")) == [(3, "SUN", "solar")]
+    sync()
+    assert clean.cur.execute("SELECT fuel_code FROM fuels ORDER BY fuel_code").fetchall() == [("COL",), ("SUN",)]
+
+    # A reset rebuilds the mapping tables from the first dimension value
+    clean.initialize_clean_tables(reset=True)
+    sync()
+    assert clean.cur.execute("SELECT COUNT(*) FROM fuels").fetchone()[0] == 2
+
+    # A rebuilt raw DB numbers its dimension values from 1 again, past the stored watermark of 3
+    rebuilt = Database("raw", path=":memory:")
+    rebuilt.initialize_raw_tables()
+    rebuilt.save_raw_data([
+        dict(base, period="2022", plantCode="1", fuel2002=code, fuelTypeDescription=code.lower(),
+             state="PR", stateDescription="", units="megawatthours")
+        for code in ("WND", "GEO", "WAT", "NUC")
+    ])
+    build_fuels_mapping(rebuilt, clean)
+    assert clean.cur.execute("SELECT fuel_code FROM fuels ORDER BY fuel_code").fetchall() == [
+        ("COL",), ("GEO",), ("NUC",), ("SUN",), ("WAT",), ("WND",)
+    ]
+    assert clean.get_clean_metadata("dimension_watermark:raw_fuels") == 4
+    rebuilt.close()
+    clean.close()
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from src.analysis import trends
+
+ROWS = [
+    (2020, "COL", 100.0), (2020, "NG", 50.0), (2020, "SUN", 0.0),
+    (2021, "COL", 80.0), (2021, "NG", 60.0), (2021, "SUN", 10.0),
+    (2022, "COL", 25.0), (2022, "NG", 72.0),                        # SUN missing -> 0
+]
+
+def test_dense_matrix():
+    years, labels, matrix = trends.dense_matrix(ROWS)
+
+    assert years.tolist() == [2020, 2021, 2022]
+    assert labels.tolist() == ["COL", "NG", "SUN"]
+    assert matrix.tolist() == [[100, 50, 0], [80, 60, 10], [25, 72, 0]]
+
+def test_empty_matrix():
+    years, labels, matrix = trends.dense_matrix([])
+    assert matrix.shape == (0, 0)
+    assert trends.summarize(years, labels, matrix) == []
+
+def test_trend_metrics():
+    years, labels, matrix = trends.dense_matrix(ROWS)
+
+    assert trends.shares(matrix).sum(axis=1) == pytest.approx([1, 1, 1])
+    assert trends.shares(matrix)[0].tolist() == pytest.approx([2 / 3, 1 / 3, 0])
+
+    growth = trends.yoy_growth(matrix)
+    assert growth.shape == (2, 3)
+    assert growth[0, :2].tolist() == pytest.approx([-0.2, 0.2])
+    assert np.isnan(growth[0, 2])                   # growth from 0
+    assert growth[1, 2] == pytest.approx(-1.0)
+
+    rates = trends.cagr(years, matrix)
+    assert rates[0] == pytest.approx(-0.5)          # 100 -> 25 over two years
+    assert rates[1] == pytest.approx(1.2 - 1)       # 50 -> 72
+    assert np.isnan(rates[2])
+
+    assert trends.ranks(matrix).tolist() == [[1, 2, 3], [1, 2, 3], [2, 1, 3]]
+    assert trends.rank_changes(matrix).tolist() == [[0, 0, 0], [-1, 1, 0]]
+
+def test_summarize():
+    years, labels, matrix = trends.dense_matrix(ROWS)
+    summary = trends.summarize(years, labels, matrix, top=2)
+
+    assert [row["label"] for row in summary] == ["NG", "COL"]
+    assert summary[0]["rank_change"] == 1
+    assert summary[0]["yoy"] == pytest.approx(0.2)
+    assert summary[1]["share"] == pytest.approx(25 / 97)
+
+def test_matrices_from_clean_db():
+    from src.db import Database
+
+    db = Database("clean", path=":memory:")
+    db.initialize_clean_tables()
+    db.conn.execute("PRAGMA foreign_keys = OFF")
+    db.save_clean_data([
+        {"year": y, "state_code": s, "fuel_code": f, "generation": g, "units": "megawatthours"}
+        for y, s, f, g in [
+            (2020, "TX", "COL", 10), (2020, "CA", "COL", 5), (2020, "TX", "ALL", 10), (2020, "CA", "ALL", 5),
+            (2021, "TX", "NG", 7), (2021, "TX", "ALL", 7),
+        ]
+    ])
+
+    years, fuels, matrix = trends.fuel_matrix(db)
+    assert fuels.tolist() == ["COL", "NG"]          # plant totals excluded
+    assert matrix.tolist() == [[15, 0], [0, 7]]
+
+    years, states, matrix = trends.state_matrix(db)
+    assert states.tolist() == ["CA", "TX"]
+    assert matrix.tolist() == [[5, 10], [0, 7]]
+    db.close()
+
+def test_plots_render(monkeypatch):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    monkeypatch.setattr(plt, "show", lambda: None)
+
+    years, labels, matrix = trends.dense_matrix(ROWS)
+    trends.plot_stacked_area(years, labels, matrix, "Generation", top=2)
+    trends.plot_heatmap(years[1:], labels, trends.yoy_growth(matrix), "YoY")
+    plt.close("all")
@@ -0,0 +1,132 @@
+from src.validate.quality import suspect_condition, validate_raw_data, yoy_jumps
+
+
+def add_rows(raw, rows):
+    base = {"plantName": "Plant", "primeMover": "ALL"}
+    raw.save_raw_data([
+        dict(base, period=p, plantCode=c, fuel2002=f, fuelTypeDescription=fd,
+             state=s, stateDescription=sd, generation=g, units=u)
+        for p, c, f, fd, s, sd, g, u in rows
+    ])
+
+
+def quarantined(raw):
+    raw.cur.execute(f"SELECT raw_id, check_name, severity FROM {raw.quarantine_table} ORDER BY raw_id, check_name")
+    return raw.cur.fetchall()
+
+
+def test_row_checks_quarantine_instead_of_abort(in_memory_raw_db):
+    raw = in_memory_raw_db
+    add_rows(raw, [
+        ("2020", "001", "ALL", "Total", "TX", "Texas", 100, "megawatthours"),        # 1 clean
+        ("2020", "002", "ALL", "Total", "TX", "Texas", None, "megawatthours"),       # 2 null
+        ("2020", "003", "ALL", "Total", "TX", "Texas", -5, "megawatthours"),         # 3 negative
+        ("2020", "004", "ALL", "Total", "TX", "Texas", 10, "kilowatthours"),         # 4 unit
+        ("2020", "005", "XYZ", None, "ZZ", None, 10, "megawatthours"),               # 5 orphans
+    ])
+
+    counts = validate_raw_data(raw, chunk_rows=2)
+    assert counts["null_generation"] == 1
+    assert counts["unknown_units"] == 1
+    assert quarantined(raw) == [
+        (2, "null_generation", "error"),
+        (3, "negative_generation", "warning"),
+        (4, "unknown_units", "error"),
+        (5, "orphan_fuel", "error"),
+        (5, "orphan_state", "warning"),
+    ]
+    # Error rows no longer reach the transform; warnings do
+    plants = [row for row in raw.get_raw_generation_rows()]
+    assert len(plants) == 2
+    assert {row[4] for row in plants} == {"megawatthours"}
+
+
+def test_validation_is_incremental(in_memory_raw_db):
+    raw = in_memory_raw_db
+    add_rows(raw, [("2020", "001", "ALL", "Total", "TX", "Texas", None, "megawatthours")])
+    validate_raw_data(raw)
+    raw.cur.execute(f"DELETE FROM {raw.quarantine_table}")
+
+    add_rows(raw, [("2021", "001", "ALL", "Total", "TX", "Texas", None, "megawatthours")])
+    counts = validate_raw_data(raw)
+    assert counts["null_generation"] == 1
+    assert quarantined(raw) == [(2, "null_generation", "error")]
+
+
+def test_yoy_jump_checks_both_directions(in_memory_raw_db):
+    raw = in_memory_raw_db
+    add_rows(raw, [("2020", "001", "ALL", "Total", "TX", "Texas", 10_000, "megawatthours")])
+    validate_raw_data(raw, max_ratio=5, min_generation=1000)
+
+    # A later year arriving after 2020 was validated flags itself...
+    add_rows(raw, [("2021", "001", "ALL", "Total", "TX", "Texas", 100_000, "megawatthours")])
+    # ...and an earlier year arriving later flags the year after it
+    add_rows(raw, [("2019", "001", "ALL", "Total", "TX", "Texas", 1_000, "megawatthours")])
+    counts = validate_raw_data(raw, max_ratio=5, min_generation=1000)
+
+    assert counts["yoy_jump"] == 2
+    assert quarantined(raw) == [(1, "yoy_jump", "warning"), (2, "yoy_jump", "warning")]
+
+
+def test_yoy_jumps_vectorized():
+    rows = [
+        (1, 600.0, None, 100.0, None, None),     # base below min_generation
+        (2, 70_000.0, None, 10_000.0, None, None),
+        (3, 10_000.0, None, None, 9, 0.0),       # next year collapses to zero
+    ]
+    flagged = yoy_jumps(rows, max_ratio=5, min_generation=1000)
+    assert [(raw_id, name) for raw_id, name, _, _ in flagged] == [(2, "yoy_jump"), (9, "yoy_jump")]
+
+
+def test_suspect_condition_only_scans_failing_dimension_values(in_memory_raw_db):
+    raw = in_memory_raw_db
+    add_rows(raw, [("2020", "001", "ALL", "Total", "TX", "Texas", 100, "megawatthours")])
+    condition, params = suspect_condition(raw)
+    assert "units" not in condition and "state" not in condition and params == ()
+
+    add_rows(raw, [("2020", "002", "ALL", "Total", "TX", "Texas", 10, "kilowatthours")])
+    condition, params = suspect_condition(raw)
+    assert "units IN (?)" in condition and params == ("kilowatthours",)
+    assert [row[0] for row in raw.get_suspect_rows(condition, 0, 2, params)] == [2]
+
+
+def test_yoy_check_is_bounded_per_run(in_memory_raw_db, monkeypatch):
+    import src.validate.quality as quality
+
+    monkeypatch.setattr(quality, "YOY_MIN_ROWS", 1)
+    raw = in_memory_raw_db
+    add_rows(raw, [
+        ("2019", "001", "ALL", "Total", "TX", "Texas", 1_000, "megawatthours"),
+        ("2020", "001", "ALL", "Total", "TX", "Texas", 10_000, "megawatthours"),
+        ("2021", "001", "ALL", "Total", "TX", "Texas", 100_000, "megawatthours"),
+    ])
+
+    # Row checks cover every new row at once; the YoY check one id per run here
+    assert validate_raw_data(raw, max_ratio=5, min_generation=1000, yoy_max_share=0.34)["yoy_jump"] == 1
+    assert raw.get_raw_metadata(quality.VALIDATION_WATERMARK) == 3
+    assert raw.get_raw_metadata(quality.YOY_WATERMARK) == 1
+    assert raw.load_metadata("validation") == 0     # crawl_metadata only holds crawl offsets
+    validate_raw_data(raw, max_ratio=5, min_generation=1000, yoy_max_share=0.34)
+    validate_raw_data(raw, max_ratio=5, min_generation=1000, yoy_max_share=0.34)
+    assert raw.get_raw_metadata(quality.YOY_WATERMARK) == 3
+    assert quarantined(raw) == [(2, "yoy_jump", "warning"), (3, "yoy_jump", "warning")]
+
+
+def test_validation_watermarks_move_out_of_crawl_metadata(tmp_path):
+    import sqlite3
+    from src.db import Database
+
+    # A raw DB validated before raw_metadata existed
+    path = str(tmp_path / "raw.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE crawl_metadata (pipeline TEXT PRIMARY KEY, lastOffset INTEGER, lastTimestamp TIMESTAMP)")
+    conn.executemany("INSERT INTO crawl_metadata (pipeline, lastOffset) VALUES (?, ?)",
+                     [("eia_generation", 5000), ("validation", 40), ("validation_yoy", 30)])
+    conn.commit()
+    conn.close()
+
+    with Database("raw", path=path) as raw:
+        raw.initialize_raw_tables()
+        assert raw.get_raw_metadata("validation_watermark") == 40
+        assert raw.get_raw_metadata("validation_yoy_watermark") == 30
+        assert raw.cur.execute("SELECT pipeline FROM crawl_metadata").fetchall() == [("eia_generation",)]